@@ -1,9 +1,11 @@
 """
 Standalone entry point for running MobileBridge as a production service.
-Usage: python -m mobile_bridge
+Usage: python -m mobile_bridge [--profile-startup]
 """
 import os
 import sys
+import time
+import subprocess
 from pathlib import Path
 
 # Load .env manually
@@ -26,7 +28,42 @@ try:
 except Exception as e:
     print(f"Error loading .env: {e}")
 
-from mobile_bridge.extension_entry import extension
+def _timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<28} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return result
+
+def profile_startup(top: int = 20):
+    """Report how long each startup phase and the slowest imports take, without serving."""
+    print("[MobileBridge] Startup phases:")
+    entry = _timed("import extension_entry", lambda: __import__("mobile_bridge.extension_entry", fromlist=["_"]))
+    _timed("build app", entry.create_app)
+    from mobile_bridge.api.routes import load_state
+    from mobile_bridge.services.llm import get_llm_client
+    _timed("load agents and seed", load_state)
+    _timed("build LLM providers", get_llm_client().reload)
+
+    # Per-module times come from a fresh interpreter so nothing is cached
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import mobile_bridge.extension_entry"],
+        capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)},
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not line.startswith("import time:") or not parts[1].strip().isdigit():
+            continue
+        self_us = int(parts[0].split(":")[1])
+        rows.append((int(parts[1]), self_us, parts[2].rstrip()))
+    print("\n[MobileBridge] Slowest imports (cumulative / self, ms):")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} {self_us / 1000:8.1f}  {name.strip()}")
 
 if __name__ == "__main__":
-    extension.start_server()
+    if "--profile-startup" in sys.argv[1:]:
+        profile_startup()
+    else:
+        from mobile_bridge.extension_entry import extension
+        extension.start_server()
@@ -8,6 +8,7 @@ from pathlib import Path
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query
 from ..services.auth import get_current_user
+from ..services.state_backend import KIND_WORKSPACE, get_state_backend
 from ..models.agent_model import ApiResponse
 
 router = APIRouter(prefix="/ide", tags=["ide"])
@@ -58,6 +59,10 @@ async def switch_workspace(payload: dict):
         raise HTTPException(status_code=400, detail="Invalid workspace path")
     
     os.environ["ANTONE_WORKSPACE"] = path
+    # Other workers follow the switch too
+    state = get_state_backend()
+    state.set("workspace_env", path)
+    state.publish(KIND_WORKSPACE, {"env": path})
     return ApiResponse(status="success", message=f"Switched to workspace: {path}", data={"workspace": path})
 
 # ─── File Browser ─────────────────────────────────────────────────────────────
@@ -67,6 +72,10 @@ IGNORED = {".git", "__pycache__", "node_modules", ".venv", "venv", ".DS_Store",
 @router.get("/files", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
 async def list_files(path: str = Query(default="", description="Relative path from workspace root")):
     """List directory contents."""
+    return ApiResponse(status="success", data=_list_files(path))
+
+def _list_files(path: str) -> dict:
+    """Blocking body of list_files, also run in a thread by the playground's tools."""
     workspace = _get_workspace()
     target = _safe_path(workspace, path)
 
@@ -92,15 +101,19 @@ async def list_files(path: str = Query(default="", description="Relative path fr
     except PermissionError:
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    return ApiResponse(status="success", data={
+    return {
         "path": str(target.relative_to(Path(workspace).resolve())) if str(target) != str(Path(workspace).resolve()) else "",
         "workspace": workspace,
         "entries": entries,
-    })
+    }
 
 @router.get("/files/read", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
 async def read_file(path: str = Query(..., description="Relative path from workspace root")):
     """Read a file's contents."""
+    return ApiResponse(status="success", data=_read_file(path))
+
+def _read_file(path: str) -> dict:
+    """Blocking body of read_file, also run in a thread by the playground's tools."""
     workspace = _get_workspace()
     target = _safe_path(workspace, path)
 
@@ -118,14 +131,14 @@ async def read_file(path: str = Query(..., description="Relative path from works
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return ApiResponse(status="success", data={
+    return {
         "path": path,
         "name": target.name,
         "content": content,
         "lines": content.count("\n") + 1,
         "size": target.stat().st_size,
         "extension": target.suffix.lstrip("."),
-    })
+    }
 
 @router.post("/files/write", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
 async def write_file(payload: dict):
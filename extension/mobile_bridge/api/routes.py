@@ -1,29 +1,39 @@
 import os
+import re
 import json
+import time
 import asyncio
+import threading
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from ..services.auth import get_current_user, get_auth_service
 from ..services.agent_registry import AgentRegistry
 from ..models.agent_model import ApiResponse, Agent, AgentStatus, PlaygroundRequest
 from ..services.event_listener import get_event_listener
-
-# Try import google generative AI
-try:
-    import google.generativeai as genai
-    HAS_GENAI = True
-except ImportError:
-    HAS_GENAI = False
+from ..services.persistence import AgentStore, get_persistence_writer
+from ..services.log_store import LogStore
+from ..services.sqlite_store import SQLiteAgentStore, SQLiteDatabase, SQLiteLogStore
+from ..services.llm import get_llm_client
+from ..services.job_queue import FINISHED, Job, get_job_queue
+from ..services.event_bus import get_event_bus
+from ..services.state_backend import KIND_JOB, KIND_WORKSPACE, applying_remote, get_state_backend
+from ..services.playground_sessions import (
+    DEFAULT_SESSION_ID, SESSION_PREFIX, PlaygroundSession, get_session_manager, resolve_session_id
+)
+from ..services.conversation import Conversation, ROLE_ASSISTANT, ROLE_TOOL, ROLE_USER
+from ..middleware.rate_limit import get_rate_limiter
+from ..config import config
 
 router = APIRouter()
 registry = AgentRegistry.get_instance()
 event_listener = get_event_listener()
 auth_service = get_auth_service()
-
-# In-memory log store per agent (will be persisted)
-_agent_logs: Dict[str, List[Dict]] = {}
+llm = get_llm_client()
+job_queue = get_job_queue()
+sessions = get_session_manager()
 
 # --- Global Workspace State ---
 def _determine_default_workspace():
@@ -32,16 +42,23 @@ def _determine_default_workspace():
         return str(cwd.parent)
     return os.environ.get("ANTONE_WORKSPACE", str(cwd))
 
-CURRENT_WORKSPACE = _determine_default_workspace()
+# Other workers may already have switched away from the default
+_state = get_state_backend()
+CURRENT_WORKSPACE = _state.get("workspace_current") or _determine_default_workspace()
+if _state.get("workspace_env"):
+    os.environ["ANTONE_WORKSPACE"] = _state.get("workspace_env")
 
 def _get_workspace() -> str:
     """Return the mutable current workspace root."""
     return CURRENT_WORKSPACE
 
-def _set_workspace(path: str):
-    """Update the current workspace."""
+def _set_workspace(path: str, share: bool = True):
+    """Update the current workspace (in every worker unless `share` is False)."""
     global CURRENT_WORKSPACE
     CURRENT_WORKSPACE = path
+    if share:
+        _state.set("workspace_current", path)
+        _state.publish(KIND_WORKSPACE, {"current": path, "env": os.environ.get("ANTONE_WORKSPACE")})
 
 def _get_persistence_file() -> str:
     # Save agents in the INITIAL root (or User Home) to avoid losing them when switching?
@@ -49,49 +66,129 @@ def _get_persistence_file() -> str:
     # Let's keep persistence in the *started* root (default).
     return os.path.join(_determine_default_workspace(), ".antone_agents.json")
 
-def _load_agents():
-    """Load agents and logs from disk."""
-    path = _get_persistence_file()
-    if not os.path.exists(path):
+def _get_log_dir() -> str:
+    return os.path.join(_determine_default_workspace(), ".antone_logs")
+
+def _get_storage_db() -> str:
+    return config.STORAGE_DB or os.path.join(_determine_default_workspace(), ".antone.db")
+
+def _snapshot() -> Dict[str, Any]:
+    """Full state written out when the journal is compacted (called from the writer thread)."""
+    return {"agents": [a.model_dump(mode='json') for a in registry.get_all()]}
+
+def _json_stores() -> Tuple[AgentStore, LogStore]:
+    agent_store = AgentStore(_get_persistence_file(), get_persistence_writer(), compact_every=config.JOURNAL_COMPACT_EVERY)
+    agent_store.set_snapshot_provider(_snapshot)
+    # Per-agent log store: bounded ring in memory, full history in on-disk segments
+    logs = LogStore(
+        _get_log_dir(),
+        get_persistence_writer(),
+        ring_size=config.LOG_RING_SIZE,
+        segment_entries=config.LOG_SEGMENT_ENTRIES,
+    )
+    return agent_store, logs
+
+if config.STORAGE_BACKEND == "sqlite":
+    # Indexed agent rows and log pages in one WAL database
+    _db = SQLiteDatabase(_get_storage_db())
+    _store = SQLiteAgentStore(_db, get_persistence_writer())
+    log_store = SQLiteLogStore(_db, get_persistence_writer())
+else:
+    _db = None
+    _store, log_store = _json_stores()
+
+def _on_agent_changed(agent_id: str, agent: Optional[Agent]):
+    # Changes from other workers were journaled by the worker that made them
+    if applying_remote():
         return
-    
     try:
-        with open(path, "r") as f:
-            data = json.load(f)
-            
+        if agent is None:
+            _store.record_agent_removed(agent_id)
+        else:
+            _store.record_agent(agent.model_dump(mode='json'))
+    except Exception as e:
+        print(f"Error journaling agent {agent_id}: {e}")
+
+# Value of the "migrated" meta row while a worker is copying data in
+_MIGRATING = "in-progress"
+
+def _migrate_to_sqlite():
+    """Copy agents and logs from the JSON and segment-file stores into the database, once.
+
+    With several workers starting together, exactly one claims the migration;
+    the others wait for it so they load the migrated agents.
+    """
+    if not _db.claim_meta("migrated", _MIGRATING):
+        deadline = time.monotonic() + 60
+        while _db.get_meta("migrated") == _MIGRATING:
+            if time.monotonic() > deadline:
+                print("Timed out waiting for another worker to migrate to SQLite")
+                return
+            time.sleep(0.2)
+        return
+    try:
+        json_store, file_logs = _json_stores()
+        agents, legacy_logs = json_store.load()
+        for agent_data in agents:
+            _store.record_agent(agent_data)
+        migrated_logs = 0
+        for agent_id, entries in legacy_logs.items():
+            log_store.import_entries(agent_id, entries)
+            migrated_logs += len(entries)
+        for agent_id in file_logs.agent_ids():
+            after = 0
+            while True:
+                entries, has_more = file_logs.query(agent_id, after=after, limit=1000)
+                for entry in entries:
+                    log_store.append(agent_id, entry.level, entry.message, timestamp=entry.timestamp)
+                migrated_logs += len(entries)
+                if not has_more or not entries:
+                    break
+                after = entries[-1].seq
+        _store.flush()
+        log_store.flush()
+    except Exception:
+        # Let the next start try again
+        _db.delete_meta("migrated")
+        raise
+    _db.set_meta("migrated", datetime.now().isoformat())
+    if agents or migrated_logs:
+        print(f"Migrated {len(agents)} agents and {migrated_logs} log entries to {_db.path}")
+
+def _load_agents():
+    """Load agents and logs from the snapshot and replay the journal."""
+    try:
+        if _db is not None:
+            _migrate_to_sqlite()
+        agents, logs = _store.load()
+
         # Restore agents
-        for agent_data in data.get("agents", []):
+        for agent_data in agents:
             if agent_data.get("last_active"):
                 agent_data["last_active"] = datetime.fromisoformat(agent_data["last_active"])
             agent = Agent(**agent_data)
             registry.update_agent(agent)
-            
-        # Restore logs
-        global _agent_logs
-        _agent_logs = data.get("logs", {})
-        print(f"Loaded {len(_agent_logs)} log entries from {path}")
-    except Exception as e:
-        print(f"Error loading agents: {e}")
 
-def _save_agents():
-    """Save agents and logs to disk."""
-    path = _get_persistence_file()
-    data = {
-        "agents": [a.model_dump(mode='json') for a in registry.get_all()],
-        "logs": _agent_logs
-    }
-    try:
-        with open(path, "w") as f:
-            json.dump(data, f, indent=2, default=str)
+        print(f"Loaded {len(agents)} agents from {_store.snapshot_path}")
+
+        # Move logs from files written before the log store existed, then
+        # compact so they are not imported a second time
+        if logs:
+            for agent_id, entries in logs.items():
+                log_store.import_entries(agent_id, entries)
+            log_store.flush()
+            _store.compact()
+            print(f"Migrated logs for {len(logs)} agents to {log_store.root}")
     except Exception as e:
-        print(f"Error saving agents: {e}")
+        print(f"Error loading agents: {e}")
 
-# Initial load
-_load_agents()
+def _append_log(agent_id: str, level: str, message: str):
+    """Record a log line for an agent."""
+    log_store.append(agent_id, level, message)
 
 def seed_mock_agents():
     """Seed initial demo agents if none exist."""
-    if len(registry.get_all()) > 0:
+    if registry.count() > 0:
         return
         
     demo_agents = [
@@ -120,80 +217,178 @@ def seed_mock_agents():
     
     print(f"Seeded {len(demo_agents)} demo agents.")
 
-def _call_llm(prompt: str, model_name: str = "gemini-2.0-flash", temperature: float = 0.7) -> str:
-    """Call LLM (NVIDIA NIM or Google Gemini)."""
-    import requests
-    
-    # 1. Try NVIDIA (Priority)
-    nvidia_key = os.environ.get("NVIDIA_API_KEY")
-    if nvidia_key:
-        try:
-            # Using Llama 3.1 405B from NVIDIA NIM
-            invoke_url = "https://integrate.api.nvidia.com/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {nvidia_key}",
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-            payload = {
-                "model": "meta/llama-3.1-405b-instruct",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": temperature,
-                "top_p": 1,
-                "max_tokens": 1024,
-                "stream": False
-            }
-            # 30s timeout
-            response = requests.post(invoke_url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                 return response.json()['choices'][0]['message']['content']
-            else:
-                 print(f"NVIDIA API Error: {response.status_code} {response.text}")
-                 # Fall through to Gemini
-        except Exception as e:
-            print(f"NVIDIA Exception: {e}")
-            # Fall through to Gemini
+# Persisted agents are loaded on first use or by the warm-up at server
+# start, so importing this module stays cheap
+_load_lock = threading.Lock()
+_state_loaded = False
 
-    # 2. Fallback to Gemini
-    if not HAS_GENAI:
-        return "Error: google-generativeai library not installed."
-        
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        return "Error: No API Key found (Checked NVIDIA_API_KEY and GEMINI_API_KEY)."
-        
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(temperature=temperature)
-        )
-        return response.text
-    except Exception as e:
-        return f"Error calling LLM: {str(e)}"
+def load_state():
+    """Load persisted agents, journal registry changes from then on and seed demo agents. Idempotent."""
+    global _state_loaded
+    if _state_loaded:
+        return
+    with _load_lock:
+        if _state_loaded:
+            return
+        _load_agents()
+        registry.add_listener(_on_agent_changed)
+        seed_mock_agents()
+        _state_loaded = True
+
+async def ensure_state_loaded():
+    """Router dependency: requests that arrive before the warm-up finished wait for it."""
+    if not _state_loaded:
+        await asyncio.get_running_loop().run_in_executor(None, load_state)
+
+def _sse_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Serialize an event stream as Server-Sent Events."""
+    async def body():
+        async for event in events:
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+    # X-Accel-Buffering stops nginx from holding chunks back
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("/health", response_model=ApiResponse)
 async def health_check():
     return ApiResponse(status="success", message="MobileBridge is running")
 
 @router.get("/agents", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
-async def get_agents(all: bool = True):
-    all_agents = registry.get_all()
-    filtered = all_agents
+async def get_agents(all: bool = True, status: Optional[AgentStatus] = None, workspace: Optional[str] = None):
+    if status is not None:
+        filtered = registry.get_by_status(status)
+        if workspace is not None:
+            filtered = [a for a in filtered if a.workspace == workspace]
+    elif workspace is not None:
+        filtered = registry.get_by_workspace(workspace)
+    else:
+        filtered = registry.get_all()
     return ApiResponse(status="success", data={"agents": [agent.model_dump() for agent in filtered]})
 
 @router.post("/playground/run", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
 async def run_playground(payload: PlaygroundRequest):
     """Execute a playground prompt using Real LLM with Tool Use capabilities."""
-    
+    result = {}
+    async for event in run_playground_events(payload):
+        if event["type"] == "done":
+            result = event
+    return ApiResponse(status="success", data={"response": result.get("response", ""), "session_id": result.get("session_id")})
+
+@router.post("/playground/run/stream", dependencies=[Depends(get_current_user)])
+async def run_playground_stream(payload: PlaygroundRequest):
+    """Server-Sent Events variant of /playground/run that streams tokens as they are generated."""
+    return _sse_response(run_playground_events(payload, stream=True))
+
+_TOOL_CALL_RE = re.compile(r"\[\[TOOL:(.*?)\]\]", re.DOTALL)
+
+# Tools that only read state and may run concurrently within a turn
+READ_ONLY_TOOLS = {"read", "list"}
+
+def _parse_tool_calls(text: str) -> List[Tuple[str, str]]:
+    """All `[[TOOL: name | args]]` calls in a response, in order."""
+    calls = []
+    for match in _TOOL_CALL_RE.finditer(text):
+        parts = [p.strip() for p in match.group(1).strip().split("|", 1)]
+        calls.append((parts[0].lower(), parts[1] if len(parts) > 1 else ""))
+    return calls
+
+async def _execute_tool(tool_name: str, tool_arg: str) -> str:
+    from .ide_routes import run_command, _list_files, _read_file
+
+    try:
+        if tool_name == "run":
+            # Always use fresh workspace
+            res = await run_command(payload={"command": tool_arg, "cwd": _get_workspace()})
+            return f"Stdout: {res.data['stdout']}\nStderr: {res.data['stderr']}\nExit: {res.data['exit_code']}"
+
+        elif tool_name == "list":
+            # ide_routes resolves paths against ANTONE_WORKSPACE, which "switch" keeps in sync
+            # Plain blocking file I/O; in a thread, batched reads actually overlap
+            data = await asyncio.to_thread(_list_files, tool_arg)
+            return json.dumps(data['entries'], default=str)
+
+        elif tool_name == "read":
+            data = await asyncio.to_thread(_read_file, tool_arg)
+            return data['content']
+
+        elif tool_name == "switch":
+            new_path = tool_arg.strip()
+            if os.path.exists(new_path) and os.path.isdir(new_path):
+                # Also update env for other modules if they rely on it
+                os.environ["ANTONE_WORKSPACE"] = new_path
+                _state.set("workspace_env", new_path)
+                _set_workspace(new_path)
+                return f"Workspace switched to: {new_path}"
+            return f"Error: Path {new_path} not found."
+
+        return "Error: Unknown tool."
+    except Exception as e:
+        return f"Error executing tool: {e}"
+
+async def _execute_tools(calls: List[Tuple[str, str]]) -> List[str]:
+    """Run a turn's tool calls, returning outputs in call order.
+
+    Consecutive read-only calls run concurrently (at most TOOL_CONCURRENCY
+    at a time); any other tool acts as a barrier and runs on its own, so
+    e.g. a read after a switch still sees the new workspace.
+    """
+    semaphore = asyncio.Semaphore(config.TOOL_CONCURRENCY)
+
+    async def bounded(name: str, arg: str) -> str:
+        async with semaphore:
+            return await _execute_tool(name, arg)
+
+    outputs: List[str] = []
+    batch: List[Tuple[str, str]] = []
+    # None marks the end; every real call, even one with an empty name, gets an output
+    for call in calls + [None]:
+        if call is not None and call[0] in READ_ONLY_TOOLS:
+            batch.append(call)
+            continue
+        if batch:
+            outputs.extend(await asyncio.gather(*(bounded(n, a) for n, a in batch)))
+            batch = []
+        if call is not None:
+            outputs.append(await _execute_tool(*call))
+    return outputs
+
+def _on_session_evicted(session_id: str):
+    """Drop the dashboard agent an evicted session created, and its in-memory log.
+
+    The history stays in the log store and /agents/{id}/logs still serves it.
+    """
+    if session_id == DEFAULT_SESSION_ID:
+        return
+    agent = registry.get_agent(session_id)
+    if agent is not None and agent.meta.get("source") == "playground":
+        registry.remove_agent(session_id)
+    log_store.evict(session_id)
+
+sessions.set_evict_callback(_on_session_evicted)
+
+async def run_playground_events(payload: PlaygroundRequest, stream: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Run the ReAct loop for the request's session, yielding events as it goes.
+
+    Events are dicts with a "type": "token" (streamed text, only when
+    `stream` is set), "tool" (a tool is about to run) and finally "done"
+    carrying the response and session id. Requests without a session_id
+    use the default session. Runs within one session are serialized.
+    """
+    session = sessions.get(resolve_session_id(payload.session_id))
+    async with session.lock:
+        session.runs += 1
+        try:
+            async for event in _run_playground_session(session, payload, stream):
+                yield event
+        finally:
+            session.touch()
+            sessions.save(session)
+
+async def _run_playground_session(session: PlaygroundSession, payload: PlaygroundRequest,
+                                  stream: bool) -> AsyncIterator[Dict[str, Any]]:
     prompt = payload.user_prompt or ""
     current_ws = _get_workspace()
     
-    # Imports for tool execution
-    from .ide_routes import run_command, list_files, read_file
-    
     SYSTEM_TEMPLATE = (
         "You are an AI agent capable of managing a software project. "
         "You have access to the following tools via special syntax:\n"
@@ -204,12 +399,13 @@ async def run_playground(payload: PlaygroundRequest):
         "Current Workspace Root: {workspace}\n"
         "If the user asks to perform an action on the project, verify context, use the appropriate tool, "
         "and then summarize the result. "
-        "You can chain multiple tools if needed, but output one at a time. "
+        "You can chain multiple tools if needed. Independent read/list calls may be issued "
+        "together in one response; their results come back together. "
         "Respond conversationally when not using tools.\n"
         "Strictly use the `[[TOOL: name | args]]` format for actions."
     )
     
-    session_id = "playground-main"
+    session_id = session.id
     
     existing_agent = registry.get_agent(session_id)
     if existing_agent:
@@ -229,111 +425,55 @@ async def run_playground(payload: PlaygroundRequest):
         )
         registry.update_agent(new_agent)
 
-    if session_id not in _agent_logs:
-        _agent_logs[session_id] = []
-        
-    _agent_logs[session_id].append(
-        {"timestamp": datetime.now().isoformat(), "level": "user", "message": prompt}
-    )
+    _append_log(session_id, "user", prompt)
 
-    # Initial Prompt Construction
+    # The session keeps its turns as messages across runs; old ones are
+    # summarized once the context exceeds its token budget
     system_prompt = SYSTEM_TEMPLATE.format(workspace=current_ws)
-    full_prompt = f"{system_prompt}\n\nUser: {prompt}\nAgent:"
+    if session.conversation is None:
+        session.conversation = Conversation(system_prompt, budget_tokens=config.CONTEXT_TOKEN_BUDGET)
+    else:
+        session.conversation.set_system_prompt(system_prompt)
+    conversation = session.conversation
+    conversation.add(ROLE_USER, prompt)
     
-    loop = asyncio.get_event_loop()
     final_response = ""
     
     # ReAct Loop (Max 5 turns)
     for _ in range(5):
         try:
             # 1. Generate thought/action
-            response_text = await loop.run_in_executor(None, _call_llm, full_prompt, payload.model, payload.temperature)
+            if stream:
+                chunks = []
+                async for chunk in llm.stream(conversation.messages(), payload.model, payload.temperature):
+                    chunks.append(chunk)
+                    yield {"type": "token", "text": chunk}
+                response_text = "".join(chunks)
+            else:
+                response_text = await llm.complete(conversation.messages(), payload.model, payload.temperature)
             
-            # 2. Check for tool call
+            # 2. Check for tool calls; a response may contain several
             if "[[TOOL:" in response_text:
-                # Parse tool
-                start = response_text.find("[[TOOL:")
-                end = response_text.find("]]", start)
-                if end == -1:
-                    full_prompt += f"\nAgent (Error): {response_text}\nSystem: Error: Malformed tool call."
+                calls = _parse_tool_calls(response_text)
+                if not calls:
+                    conversation.add(ROLE_ASSISTANT, response_text)
+                    conversation.add(ROLE_TOOL, "Error: Malformed tool call.")
                     continue
-                
-                tool_call = response_text[start+7:end].strip()
-                parts = [p.strip() for p in tool_call.split("|", 1)]
-                tool_name = parts[0].lower()
-                tool_arg = parts[1] if len(parts) > 1 else ""
-                
-                log_msg = f"Executing: {tool_name} {tool_arg}"
-                _agent_logs[session_id].append({"timestamp": datetime.now().isoformat(), "level": "info", "message": log_msg})
-                
-                # Execute Tool
-                tool_output = ""
-                try:
-                    if tool_name == "run":
-                        # Always use fresh workspace
-                        res = await run_command(payload={"command": tool_arg, "cwd": _get_workspace()})
-                        tool_output = f"Stdout: {res.data['stdout']}\nStderr: {res.data['stderr']}\nExit: {res.data['exit_code']}"
-                    
-                    elif tool_name == "list":
-                        res = await list_files(path=tool_arg) # list_files uses _get_workspace internaly? No, it imports from ide_routes.
-                        # Wait, list_files in ide_routes calls _get_workspace() locally?
-                        # ide_routes.py defines its OWN _get_workspace or imports?
-                        # I need to check ide_routes.py. If it imports from routes.py, circle dep.
-                        # Usually ide_routes.py has its own _get_workspace.
-                        # If so, I need to patch ide_routes.py to use THIS module's workspace or share state.
-                        # CRITICAL: ide_routes.py probably has independent workspace logic.
-                        # I MUST CHECK THIS. 
-                        # Assuming for now I can pass 'cwd' to list_files if valid?
-                        # checking list_files signature in previous view: it takes 'path'.
-                        # It calls _get_workspace() internally.
-                        
-                        # Fix: I'll handle "switch" here, but for "list/run", I need to ensure they use NEW root.
-                        # Run command takes 'cwd'. list_files does NOT take cwd (it uses default).
-                        
-                        # Hack: I will re-implement list_files logic here or rely on ide_routes using os.environ?
-                        # Or... just update os.environ["ANTONE_WORKSPACE"]?
-                        # ide_routes.py likely reads os.environ.
-                        # Let's hope so.
-                        
-                        tool_output = "Output from list files (check impl)"
-                        # Let's verify list_files call below.
-                         
-                        import mobile_bridge.api.ide_routes as ide_routes
-                        # Monkey patch?
-                        original_get_ws = getattr(ide_routes, "_get_workspace", None)
-                        if original_get_ws:
-                             # This is ugly.
-                             pass
-                             
-                        # Better: Update os.environ
-                        # If ide_routes reads env, this works.
-                        
-                        # Running tool normally for now:
-                        res = await list_files(path=tool_arg)
-                        tool_output = json.dumps(res.data['entries'], default=str)
-                        
-                    elif tool_name == "read":
-                        res = await read_file(path=tool_arg)
-                        tool_output = res.data['content']
-                        
-                    elif tool_name == "switch":
-                        new_path = tool_arg.strip()
-                        if os.path.exists(new_path) and os.path.isdir(new_path):
-                            _set_workspace(new_path)
-                            # Also update env for other modules if they rely on it
-                            os.environ["ANTONE_WORKSPACE"] = new_path
-                            tool_output = f"Workspace switched to: {new_path}"
-                            current_ws = new_path # Update local var
-                        else:
-                            tool_output = f"Error: Path {new_path} not found."
-                    
-                    else:
-                        tool_output = "Error: Unknown tool."
-                except Exception as e:
-                    tool_output = f"Error executing tool: {e}"
-                
-                # Update Prompt with Result
-                full_prompt += f"\nAgent: {response_text}\nSystem: Tool Output: {tool_output[:2000]}...\n(Output truncated if too long)\nAgent:"
+
+                for tool_name, tool_arg in calls:
+                    _append_log(session_id, "info", f"Executing: {tool_name} {tool_arg}")
+                    yield {"type": "tool", "name": tool_name, "arg": tool_arg}
+
+                outputs = await _execute_tools(calls)
+
+                # Update Prompt with all results in one turn
+                limit = config.CONTEXT_TOOL_OUTPUT_CHARS
+                results = [
+                    f"Tool Output ({name} {arg}): {output[:limit]}{'...(truncated)' if len(output) > limit else ''}"
+                    for (name, arg), output in zip(calls, outputs)
+                ]
+                conversation.add(ROLE_ASSISTANT, response_text)
+                conversation.add(ROLE_TOOL, "\n\n".join(results))
                 
             else:
                 final_response = response_text
@@ -343,12 +483,114 @@ async def run_playground(payload: PlaygroundRequest):
             final_response = f"Error in agent execution: {str(e)}"
             break
             
-    _agent_logs[session_id].append(
-        {"timestamp": datetime.now().isoformat(), "level": "agent", "message": final_response}
-    )
-    _save_agents()
+    _append_log(session_id, "agent", final_response)
+    conversation.add(ROLE_ASSISTANT, final_response)
     
-    return ApiResponse(status="success", data={"response": final_response, "session_id": session_id})
+    yield {"type": "done", "response": final_response, "session_id": session_id}
+
+async def _publish_job_event(job: Job, event: Dict[str, Any]):
+    if event.get("type") == "status" and _state.shared:
+        # Jobs run in the worker that accepted them; others answer from this copy
+        _state.set(f"job:{job.id}", json.dumps(job.to_dict()), ttl=config.JOB_STATE_TTL)
+    await event_listener.on_job_event(job.id, job.agent_id or "", event)
+
+def _shared_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Status of a job running in another worker, if any."""
+    if not _state.shared:
+        return None
+    saved = _state.get(f"job:{job_id}")
+    return json.loads(saved) if saved else None
+
+def _cancel_remote_job(job_id: str):
+    """Cancel a job another worker was asked to cancel. Runs on the loop."""
+    asyncio.ensure_future(job_queue.cancel(job_id))
+
+job_queue.set_publisher(_publish_job_event)
+
+@router.get("/playground/sessions", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def list_playground_sessions():
+    """Live playground sessions, most recently used first."""
+    return ApiResponse(status="success", data={"sessions": [s.to_dict() for s in sessions.list()]})
+
+@router.delete("/playground/sessions/{session_id}", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def close_playground_session(session_id: str):
+    """Drop a session's conversation context; its agent and logs are kept."""
+    if not sessions.remove(resolve_session_id(session_id)):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return ApiResponse(status="success", message=f"Session {session_id} closed")
+
+@router.post("/playground/jobs", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def submit_playground_job(payload: PlaygroundRequest, priority: int = Query(default=0)):
+    """Queue a playground run in the background; progress is pushed over /ws/realtime."""
+    # Fix the session up front so job events can be attributed to it
+    payload.session_id = resolve_session_id(payload.session_id)
+    job = await job_queue.submit(
+        "playground",
+        lambda job: run_playground_events(payload),
+        workspace=_get_workspace(),
+        priority=priority,
+        agent_id=payload.session_id,
+    )
+    return ApiResponse(status="success", data=job.to_dict())
+
+@router.get("/jobs", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def list_jobs(status: Optional[str] = None):
+    return ApiResponse(status="success", data={"jobs": [job.to_dict() for job in job_queue.list(status)]})
+
+@router.get("/jobs/{job_id}", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    data = job.to_dict() if job else _shared_job(job_id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ApiResponse(status="success", data=data)
+
+@router.post("/jobs/{job_id}/cancel", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def cancel_job(job_id: str):
+    job = await job_queue.cancel(job_id)
+    if job:
+        return ApiResponse(status="success", data=job.to_dict())
+    data = _shared_job(job_id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if data["status"] not in FINISHED:
+        # The worker running it cancels it and publishes the new status
+        _state.publish(KIND_JOB, {"cancel": job_id})
+    return ApiResponse(status="success", data=data)
+
+@router.get("/agents/{agent_id}/logs", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def get_agent_logs(
+    agent_id: str,
+    after: Optional[int] = Query(default=None, description="Return entries with seq greater than this cursor"),
+    before: Optional[int] = Query(default=None, description="Return entries with seq lower than this cursor"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    level: Optional[str] = Query(default=None, description="Comma-separated levels, e.g. user,agent"),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
+):
+    """Page through an agent's log history, newest page first unless `after` is given."""
+    # Evicted playground sessions no longer have an agent but keep their history
+    if not registry.get_agent(agent_id) and not agent_id.startswith(SESSION_PREFIX):
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    levels = {l.strip() for l in level.split(",") if l.strip()} if level else None
+    loop = asyncio.get_event_loop()
+    entries, has_more = await loop.run_in_executor(None, lambda: log_store.query(
+        agent_id,
+        after=after,
+        before=before,
+        limit=limit,
+        levels=levels,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+    ))
+    return ApiResponse(status="success", data={
+        "logs": [e.to_dict() for e in entries],
+        "has_more": has_more,
+        # Cursors for the adjacent pages
+        "before": entries[0].seq if entries else before,
+        "after": entries[-1].seq if entries else after,
+    })
 
 @router.post("/agents/{agent_id}/approve", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
 async def approve_agent(agent_id: str):
@@ -362,10 +604,8 @@ async def approve_agent(agent_id: str):
     
     registry.update_agent(agent)
     
-    _agent_logs.setdefault(agent_id, []).append(
-        {"timestamp": datetime.now().isoformat(), "level": "info", "message": "Task approved. Agent resumed."})
+    _append_log(agent_id, "info", "Task approved. Agent resumed.")
     
-    _save_agents()
     return ApiResponse(status="success", message=f"Approval sent for agent {agent_id}")
 
 @router.post("/agents/{agent_id}/message", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
@@ -373,36 +613,65 @@ async def send_message(agent_id: str, payload: Dict[str, str]):
     agent = registry.get_agent(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-        
-    message = payload.get("message", "")
-    _agent_logs.setdefault(agent_id, []).append(
-        {"timestamp": datetime.now().isoformat(), "level": "user", "message": f"[You]: {message}"})
+
+    async for _ in send_message_events(agent, payload.get("message", "")):
+        pass
+    return ApiResponse(status="success", message="Message delivered to agent")
+
+@router.post("/agents/{agent_id}/message/stream", dependencies=[Depends(get_current_user)])
+async def send_message_stream(agent_id: str, payload: Dict[str, str]):
+    """Server-Sent Events variant of /agents/{agent_id}/message."""
+    agent = registry.get_agent(agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return _sse_response(send_message_events(agent, payload.get("message", ""), stream=True))
+
+async def send_message_events(agent: Agent, message: str, stream: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Deliver a user message to an agent, yielding "token" events (when streaming) and a final "done"."""
+    _append_log(agent.id, "user", f"[You]: {message}")
         
     system_prompt = f"You are an AI agent named '{agent.name}'. Your current task is '{agent.current_task}'. status: {agent.status}. Respond to the user."
     full_prompt = f"{system_prompt}\n\nUser: {message}\nAgent:"
     
-    loop = asyncio.get_event_loop()
-    response_text = await loop.run_in_executor(None, _call_llm, full_prompt)
+    if stream:
+        chunks = []
+        async for chunk in llm.stream(full_prompt):
+            chunks.append(chunk)
+            yield {"type": "token", "text": chunk}
+        response_text = "".join(chunks)
+    else:
+        # Interactive reply: worth racing a slow provider against the next one
+        response_text = await llm.complete(full_prompt, hedge=True)
     
-    _agent_logs[agent_id].append(
-        {"timestamp": datetime.now().isoformat(), "level": "agent", "message": response_text})
-        
-    _save_agents()
-    return ApiResponse(status="success", message="Message delivered to agent")
+    _append_log(agent.id, "agent", response_text)
+    yield {"type": "done", "response": response_text, "agent_id": agent.id}
 
 @router.get("/system/status", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
 async def system_status():
-    all_agents = registry.get_all()
-    running = sum(1 for a in all_agents if a.status == AgentStatus.RUNNING)
-    waiting = sum(1 for a in all_agents if a.status == AgentStatus.WAITING_APPROVAL)
+    limiter = get_rate_limiter()
     return ApiResponse(status="success", data={
         "uptime": "running",
-        "active_agents": running,
-        "waiting_approval": waiting,
-        "total_agents": len(all_agents),
-        "workspace": _get_workspace()
+        "active_agents": registry.count(AgentStatus.RUNNING),
+        "waiting_approval": registry.count(AgentStatus.WAITING_APPROVAL),
+        "total_agents": registry.count(),
+        "agents_by_status": registry.status_counts(),
+        "workspace": _get_workspace(),
+        "llm_cache": llm.cache.stats() if llm.cache else None,
+        "llm_providers": llm.router.snapshot(),
+        "jobs": job_queue.stats(),
+        "event_bus": get_event_bus().stats(),
+        "state_backend": _state.stats(),
+        "auth_cache": auth_service.cache_stats(),
+        "rate_limit": limiter.stats() if limiter else None,
+        "storage": {"backend": "sqlite" if _db is not None else "json", "path": _store.snapshot_path}
     })
 
+@router.post("/system/providers/reload", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def reload_providers():
+    """Pick up changed LLM API keys without restarting; untouched providers keep their cached clients."""
+    changed = llm.reload()
+    return ApiResponse(status="success", data={"reloaded": [name for name, rebuilt in changed.items() if rebuilt]})
+
 @router.post("/auth/pair", response_model=ApiResponse)
 async def pair_device(payload: Dict[str, str]):
     pairing_key = payload.get("pairing_key")
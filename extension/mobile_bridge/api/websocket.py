@@ -1,30 +1,402 @@
+import json
+import time
+import uuid
+import asyncio
+import itertools
+from collections import deque
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from typing import List
-from ..services.auth import get_auth_service
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from pydantic import ValidationError
+from ..services.auth import get_auth_service, get_current_user
+from ..services.agent_registry import AgentRegistry
+from ..services.subscriptions import SubscriptionIndex, event_topics, topics_from_request
+from ..models.agent_model import ApiResponse, PlaygroundRequest
+from ..config import config
+from .routes import ensure_state_loaded, run_playground_events, send_message_events
 
 router = APIRouter()
 auth_service = get_auth_service()
 
+# What to do when a client's outbound queue is full
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_DISCONNECT = "disconnect"
+
+_connection_ids = itertools.count(1)
+
+class ClientConnection:
+    """A socket plus its bounded outbound queue, drained by a dedicated sender task.
+
+    Broadcasts only enqueue, so a slow client delays nobody but itself.
+    With the coalesce policy a queued message is replaced in place by a
+    newer one with the same key (e.g. the latest state of an agent);
+    once full the queue drops its oldest message, or with the disconnect
+    policy closes the client instead.
+
+    Clients that opt into batching get everything queued during a short
+    window as one {"type": "batch", "events": [...]} frame, plus agent
+    deltas: the fields of each agent that changed in the window, merged.
+
+    Replies to the client's own streaming requests go through the same
+    sender but are never dropped or coalesced; reply() waits for room
+    instead, which slows the producing stream down to the client's pace.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int, policy: str, on_close, batch_window: float = 0):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.batch_window = batch_window
+        # agent id -> merged changed fields, or None once removed (batching clients only)
+        self._deltas: Dict[str, Optional[Dict[str, Any]]] = {}
+        # Sequence number of the newest change merged into each delta
+        self._delta_seq: Dict[str, int] = {}
+        # [key, message] entries; keyed ones are also indexed for coalescing
+        self._queue: Deque[list] = deque()
+        self._keyed: Dict[str, list] = {}
+        self._replies: Deque[str] = deque()
+        self._reply_slots = asyncio.Semaphore(max_queue)
+        self._ready = asyncio.Event()
+        self._on_close = on_close
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+        self.id = next(_connection_ids)
+        self.connected_at = time.monotonic()
+        # Last frame received from the client, for the idle timeout
+        self.last_seen = self.connected_at
+        # When the in-flight send started; None while the sender is idle
+        self.sending_since: Optional[float] = None
+        self._sender = asyncio.create_task(self._drain())
+
+    def enqueue(self, message: str, key: Optional[str] = None):
+        if self.closed:
+            return
+        if key is not None and self.policy == OVERFLOW_COALESCE:
+            entry = self._keyed.get(key)
+            if entry is not None:
+                entry[1] = message
+                self.coalesced += 1
+                return
+        if len(self._queue) >= self.max_queue:
+            if self.policy == OVERFLOW_DISCONNECT:
+                asyncio.create_task(self.close(code=1013))
+                return
+            oldest = self._queue.popleft()
+            if oldest[0] is not None and self._keyed.get(oldest[0]) is oldest:
+                del self._keyed[oldest[0]]
+            self.dropped += 1
+        entry = [key, message]
+        self._queue.append(entry)
+        if key is not None:
+            self._keyed[key] = entry
+        self._ready.set()
+
+    async def reply(self, message: str):
+        """Queue a reply to one of the client's requests, waiting while the client is behind."""
+        await self._reply_slots.acquire()
+        if self.closed:
+            return
+        self._replies.append(message)
+        self._ready.set()
+
+    def _reply_sent(self):
+        self._reply_slots.release()
+
+    def enqueue_delta(self, agent_id: str, changes: Optional[Dict[str, Any]], seq: int):
+        """Merge an agent's changed fields into the next batch; None means it was removed."""
+        if self.closed:
+            return
+        self._delta_seq[agent_id] = seq
+        if changes is None:
+            self._deltas[agent_id] = None
+        elif self._deltas.get(agent_id, {}) is None:
+            # Removed and re-added within the window; `changes` is its full state
+            self._deltas[agent_id] = dict(changes)
+        else:
+            self._deltas.setdefault(agent_id, {}).update(changes)
+        self._ready.set()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue) + len(self._deltas) + len(self._replies)
+
+    def _take_batch(self) -> Optional[str]:
+        """Everything pending as one pre-serialized batch frame."""
+        events = [entry[1] for entry in self._queue]
+        events.extend(self._replies)
+        for _ in self._replies:
+            self._reply_sent()
+        self._replies.clear()
+        for agent_id, changes in self._deltas.items():
+            events.append(_delta_message(self._delta_seq[agent_id], agent_id, changes))
+        self._queue.clear()
+        self._keyed.clear()
+        self._deltas.clear()
+        self._delta_seq.clear()
+        if not events:
+            return None
+        return '{"type":"batch","events":[' + ",".join(events) + "]}"
+
+    async def _drain(self):
+        try:
+            while True:
+                await self._ready.wait()
+                if self.batch_window:
+                    # Let the window fill, then send it all as one frame
+                    await asyncio.sleep(self.batch_window)
+                    self._ready.clear()
+                    frame = self._take_batch()
+                    if frame:
+                        await self._send(frame)
+                    continue
+                # Alternate so neither broadcasts nor replies starve the other
+                while self._queue or self._replies:
+                    if self._queue:
+                        entry = self._queue.popleft()
+                        if entry[0] is not None and self._keyed.get(entry[0]) is entry:
+                            del self._keyed[entry[0]]
+                        await self._send(entry[1])
+                    if self._replies:
+                        await self._send(self._replies.popleft())
+                        self._reply_sent()
+                self._ready.clear()
+        except Exception:
+            # Send failed: the client is gone
+            await self.close()
+
+    async def _send(self, message: str):
+        self.sending_since = time.monotonic()
+        await self.websocket.send_text(message)
+        self.sending_since = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        client = self.websocket.client
+        return {
+            "id": self.id,
+            "client": f"{client.host}:{client.port}" if client else None,
+            "connected_seconds": round(now - self.connected_at, 1),
+            "idle_seconds": round(now - self.last_seen, 1),
+            "queue_depth": self.depth,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "batch_ms": round(self.batch_window * 1000),
+        }
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._keyed.clear()
+        self._replies.clear()
+        self._deltas.clear()
+        self._delta_seq.clear()
+        if self._sender is not asyncio.current_task():
+            self._sender.cancel()
+        self._on_close(self)
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+def _with_seq(seq: int, message: str) -> str:
+    """Prefix a serialized JSON object with its sequence number, without re-serializing it."""
+    body = message.strip()[1:]
+    return f'{{"seq":{seq}' + ("," + body if body.strip() != "}" else "}")
+
+def _delta_message(seq: int, agent_id: str, changes: Optional[Dict[str, Any]]) -> str:
+    if changes is None:
+        return json.dumps({"seq": seq, "type": "agent_removed", "agent_id": agent_id})
+    return json.dumps({"seq": seq, "type": "agent_delta", "agent_id": agent_id, "changes": changes}, default=str)
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Delivers events to clients.
+
+    Every event gets the next sequence number and is kept in a bounded
+    replay buffer, so a client reconnecting with ?since=<seq> is sent just
+    what it missed (or a full snapshot once the buffer has moved past it).
+    Sequence numbers restart with every process, so they are only
+    comparable within one epoch; clients echo it back with ?epoch=.
+    """
+
+    def __init__(self, max_queue: int = 256, policy: str = OVERFLOW_COALESCE, replay_size: int = 1000):
+        self.max_queue = max_queue
+        self.policy = policy
+        self.seq = 0
+        self.epoch = uuid.uuid4().hex[:12]
+        self.reaped = 0
+        self._reaper: Optional[asyncio.Task] = None
+        # (seq, message, is_delta) for the newest events
+        self._replay: Deque[Tuple[int, str, bool]] = deque(maxlen=replay_size)
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.subscriptions = SubscriptionIndex(max_topics=config.WS_MAX_SUBSCRIPTIONS)
+        # Last known state of each agent, to compute deltas from
+        self._agent_state: Dict[str, Dict[str, Any]] = {}
 
-    async def connect(self, websocket: WebSocket):
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.connections)
+
+    async def connect(self, websocket: WebSocket, batch_window: float = 0, since: Optional[int] = None,
+                      epoch: Optional[str] = None) -> ClientConnection:
         await websocket.accept()
-        self.active_connections.append(websocket)
+        conn = ClientConnection(websocket, self.max_queue, self.policy, self._reap, batch_window)
+        self.connections[websocket] = conn
+        self.subscriptions.add(conn)
+        # Queued ahead of any live event since nothing awaits in between
+        conn.enqueue(self._resume_message(conn, since, epoch))
+        return conn
+
+    def _resume_message(self, conn: ClientConnection, since: Optional[int], epoch: Optional[str] = None) -> str:
+        """First frame for a new connection: the current seq and epoch, plus missed events when resuming.
+
+        {"type": "hello", "seq": N, "epoch": E} for fresh clients or when
+        nothing was missed; {"type": "replay", ..., "events": [...]} when
+        the buffer still holds everything after `since`; otherwise
+        {"type": "snapshot", ..., "agents": [...]} so the client can rebuild
+        its state. A `since` from another epoch (a restart, or another
+        worker) or beyond the current seq always gets a snapshot.
+        """
+        if since is None or (epoch == self.epoch and since == self.seq):
+            return json.dumps({"type": "hello", "seq": self.seq, "epoch": self.epoch})
+        oldest = self._replay[0][0] if self._replay else self.seq + 1
+        if epoch != self.epoch or since > self.seq or since + 1 < oldest:
+            agents = [a.model_dump(mode="json") for a in AgentRegistry.get_instance().get_all()]
+            return json.dumps({"type": "snapshot", "seq": self.seq, "epoch": self.epoch, "agents": agents})
+        events = [message for seq, message, is_delta in self._replay
+                  if seq > since and (conn.batch_window or not is_delta)]
+        return (f'{{"type":"replay","seq":{self.seq},"epoch":"{self.epoch}","events":['
+                + ",".join(events) + "]}")
+
+    def start(self):
+        """Start the heartbeat/reaper task on the running loop."""
+        if self._reaper is None and config.WS_PING_INTERVAL > 0:
+            self._reaper = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for conn in list(self.connections.values()):
+            await conn.close(code=1001)
+
+    async def _heartbeat(self):
+        """Close clients that stopped responding.
+
+        A client is reaped when a single send has been stuck for
+        WS_SEND_TIMEOUT, the usual sign of a half-open connection, or, if
+        WS_IDLE_TIMEOUT is set, once nothing has been received from it for
+        that long. Only then are clients sent ping frames, which they answer
+        with {"type": "pong"}; older app versions treat every frame as a
+        change and refetch, so they are not pinged otherwise.
+        """
+        while True:
+            await asyncio.sleep(config.WS_PING_INTERVAL)
+            now = time.monotonic()
+            ping = json.dumps({"type": "ping", "seq": self.seq})
+            for conn in list(self.connections.values()):
+                idle = config.WS_IDLE_TIMEOUT and now - conn.last_seen > config.WS_IDLE_TIMEOUT
+                stuck = conn.sending_since is not None and now - conn.sending_since > config.WS_SEND_TIMEOUT
+                if idle or stuck or conn.closed:
+                    self.reaped += 1
+                    asyncio.create_task(conn.close(code=1001))
+                elif config.WS_IDLE_TIMEOUT:
+                    conn.enqueue(ping)
+
+    def stats(self) -> Dict[str, Any]:
+        conns = list(self.connections.values())
+        return {
+            "connections": len(conns),
+            "batching": sum(1 for c in conns if c.batch_window),
+            "queued": sum(c.depth for c in conns),
+            "max_queue_depth": max((c.depth for c in conns), default=0),
+            "dropped": sum(c.dropped for c in conns),
+            "reaped": self.reaped,
+            "seq": self.seq,
+            "clients": [c.stats() for c in conns],
+        }
+
+    def _reap(self, conn: ClientConnection):
+        if self.connections.get(conn.websocket) is conn:
+            del self.connections[conn.websocket]
+        self.subscriptions.remove(conn)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        conn = self.connections.pop(websocket, None)
+        if conn:
+            self.subscriptions.remove(conn)
+            if not conn.closed:
+                conn.closed = True
+                conn._sender.cancel()
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception:
-                # Handle disconnected clients gracefully if not caught by disconnect
-                pass
+    async def broadcast(self, message: str, key: Optional[str] = None, topics: Optional[List[str]] = None):
+        self.publish(message, key, topics)
+
+    def publish(self, message: str, key: Optional[str] = None, topics: Optional[List[str]] = None):
+        """Queue a message for interested clients; never waits on a slow socket.
+
+        Must run on the server loop (see EventBus for other threads).
+        `key` marks messages that supersede earlier ones with the same key
+        when the coalesce policy is in effect. With `topics`, only clients
+        subscribed to one of them (or to nothing at all) receive it.
+        """
+        self.seq += 1
+        message = _with_seq(self.seq, message)
+        self._replay.append((self.seq, message, False))
+        recipients = self.connections.values() if topics is None else self.subscriptions.recipients(topics)
+        for conn in list(recipients):
+            conn.enqueue(message, key)
+
+    def agent_changed(self, agent_id: str, state: Optional[Dict[str, Any]]):
+        """Send batching clients the fields of an agent that changed. Runs on the server loop."""
+        previous = self._agent_state.pop(agent_id, None) if state is None else self._agent_state.get(agent_id)
+        if state is None:
+            changes = None
+            workspace = previous.get("workspace") if previous else None
+        else:
+            self._agent_state[agent_id] = state
+            changes = {k: v for k, v in state.items() if previous is None or previous.get(k) != v}
+            if not changes:
+                return
+            workspace = state.get("workspace")
+        self.seq += 1
+        self._replay.append((self.seq, _delta_message(self.seq, agent_id, changes), True))
+        for conn in self.subscriptions.recipients(event_topics(agent_id, "agent_delta", workspace)):
+            if conn.batch_window:
+                conn.enqueue_delta(agent_id, changes, self.seq)
 
-manager = ConnectionManager()
+manager = ConnectionManager(max_queue=config.WS_SEND_QUEUE_SIZE, policy=config.WS_OVERFLOW_POLICY,
+                            replay_size=config.WS_REPLAY_BUFFER)
+
+async def _stream_request(conn: ClientConnection, request: Dict[str, Any]):
+    """Handle a streaming request sent over the socket, replying with chunk frames.
+
+    Requests:
+        {"type": "playground", "request_id": ..., <PlaygroundRequest fields>}
+        {"type": "message", "request_id": ..., "agent_id": ..., "message": ...}
+
+    Replies are the same events as the SSE endpoints ("token", "tool",
+    "done", or "error"), each tagged with the request_id.
+    """
+    request_id = request.get("request_id")
+    try:
+        if request["type"] == "playground":
+            events = run_playground_events(PlaygroundRequest(**request), stream=True)
+        else:
+            agent = AgentRegistry.get_instance().get_agent(request.get("agent_id", ""))
+            if not agent:
+                await conn.reply(json.dumps({"type": "error", "request_id": request_id, "message": "Agent not found"}))
+                return
+            events = send_message_events(agent, request.get("message", ""), stream=True)
+
+        async for event in events:
+            await conn.reply(json.dumps({**event, "request_id": request_id}, default=str))
+    except ValidationError as e:
+        await conn.reply(json.dumps({"type": "error", "request_id": request_id, "message": str(e)}))
+    except Exception as e:
+        print(f"WebSocket stream error: {e}")
 
 @router.websocket("/ws/realtime")
 async def websocket_endpoint(websocket: WebSocket):
@@ -40,13 +412,61 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.close(code=1008)
         return
 
-    await manager.connect(websocket)
+    # ?batch=<ms> opts into batched frames with agent deltas
+    try:
+        batch_ms = min(max(int(websocket.query_params.get("batch", 0)), 0), config.WS_BATCH_MAX_MS)
+    except ValueError:
+        batch_ms = 0
+
+    # ?since=<seq>&epoch=<epoch> resumes after the last event the client saw
+    try:
+        since = int(websocket.query_params["since"]) if "since" in websocket.query_params else None
+    except ValueError:
+        since = None
+
+    # The resume snapshot must include persisted agents
+    await ensure_state_loaded()
+    conn = await manager.connect(websocket, batch_window=batch_ms / 1000, since=since,
+                                 epoch=websocket.query_params.get("epoch"))
+    tasks: Set[asyncio.Task] = set()
     try:
         while True:
-            # Keep connection alive, listen for client messages if needed (e.g. ping)
+            # Keep connection alive; JSON requests with a known "type" manage
+            # subscriptions ({"type": "subscribe", "agents": [...], "workspaces": [...],
+            # "events": [...]}, likewise "unsubscribe") or start a stream
             data = await websocket.receive_text()
-    except WebSocketDisconnect:
+            conn.last_seen = time.monotonic()
+            try:
+                request = json.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(request, dict):
+                continue
+            if request.get("type") == "ping":
+                conn.enqueue(json.dumps({"type": "pong", "seq": manager.seq}))
+            elif request.get("type") in ("subscribe", "unsubscribe"):
+                topics = topics_from_request(request)
+                if request["type"] == "subscribe":
+                    current = manager.subscriptions.subscribe(conn, topics)
+                else:
+                    current = manager.subscriptions.unsubscribe(conn, topics)
+                conn.enqueue(json.dumps({"type": "subscriptions", "topics": sorted(current)}))
+            elif request.get("type") in ("playground", "message"):
+                task = asyncio.create_task(_stream_request(conn, request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the server side already closed the socket (e.g. overflow)
+        pass
+    finally:
         manager.disconnect(websocket)
+        for task in tasks:
+            task.cancel()
+
+@router.get("/system/connections", response_model=ApiResponse, dependencies=[Depends(get_current_user)])
+async def connection_stats():
+    """Live realtime connections and their outbound queue depths."""
+    return ApiResponse(status="success", data=manager.stats())
 
 def get_connection_manager():
     return manager
@@ -6,8 +6,98 @@ class Config:
     PORT = int(os.getenv("PORT", "8001"))
     JWT_SECRET = os.getenv("MOBILE_BRIDGE_JWT_SECRET", os.getenv("JWT_SECRET", secrets.token_hex(32)))
     JWT_ALGORITHM = "HS256"
+    # Verified tokens remembered so repeat requests skip JWT decoding (0 disables)
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
     # Use /var/lib/antone for writable runtime data (production), fallback to cwd for dev
     _data_dir = os.getenv("DATA_DIR", os.path.join(os.path.expanduser("~"), ".antone"))
     PAIRING_KEY_FILE = os.path.join(_data_dir, ".mobile_bridge_pairing_key")
+    # Uvicorn worker processes; more than one needs a shared state backend
+    WORKERS = int(os.getenv("WORKERS", "1"))
+    # State shared between workers: "memory" (single worker) or "sqlite"
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+    STATE_DB = os.getenv("STATE_DB", os.path.join(_data_dir, "state.db"))
+    # Seconds between polls for changes made by other workers
+    STATE_POLL_INTERVAL = float(os.getenv("STATE_POLL_INTERVAL", "0.1"))
+    # Token-bucket rate limits in requests per minute: per client IP, per route
+    # prefix ("prefix=rpm,..." on top of the IP limit) and per bearer token (0 disables)
+    RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+    RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "/auth/pair=10")
+    RATE_LIMIT_PER_TOKEN = int(os.getenv("RATE_LIMIT_PER_TOKEN", "0"))
+    # Clients tracked by the rate limiter before the least recently seen are dropped
+    RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+    # Proxies (IPs or CIDRs) whose X-Real-IP / X-Forwarded-For headers are believed
+    TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1")
+    # Number of journal records before the agent store is compacted into a snapshot
+    JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "500"))
+    # Minimum seconds between background persistence writes (bursts are coalesced)
+    PERSIST_INTERVAL = float(os.getenv("PERSIST_INTERVAL", "1.0"))
+    # Agent and log storage: "json" (snapshot/journal and log segment files) or "sqlite"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+    # Database for STORAGE_BACKEND=sqlite; defaults to .antone.db in the default workspace
+    STORAGE_DB = os.getenv("STORAGE_DB", "")
+    # Per-agent log entries kept in memory; older ones are only on disk
+    LOG_RING_SIZE = int(os.getenv("LOG_RING_SIZE", "200"))
+    # Entries per on-disk log segment file
+    LOG_SEGMENT_ENTRIES = int(os.getenv("LOG_SEGMENT_ENTRIES", "2000"))
+    # LLM provider HTTP pool and timeouts (seconds)
+    NVIDIA_BASE_URL = os.getenv("NVIDIA_BASE_URL", "https://integrate.api.nvidia.com/v1")
+    NVIDIA_TIMEOUT = float(os.getenv("NVIDIA_TIMEOUT", "30"))
+    GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+    # Opt-in response cache for deterministic (low temperature) prompts
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+    LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+    LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", "")
+    # Provider circuit breaker: open when the error rate over the last WINDOW calls
+    # reaches ERROR_RATE (after MIN_CALLS), retry after COOLDOWN seconds
+    LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "10"))
+    LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+    LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "3"))
+    LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+    # Seconds before a hedged call is also sent to the next provider (0 disables hedging)
+    LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "0"))
+    # Estimated-token budget for the playground ReAct context; older turns are summarized
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+    # Characters of each tool result fed back to the model
+    CONTEXT_TOOL_OUTPUT_CHARS = int(os.getenv("CONTEXT_TOOL_OUTPUT_CHARS", "2000"))
+    # Read-only tool calls from one ReAct turn executed concurrently
+    TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+    # Background jobs: worker pool size, concurrent jobs per workspace, finished jobs kept
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_WORKSPACE_CONCURRENCY = int(os.getenv("JOB_WORKSPACE_CONCURRENCY", "1"))
+    JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))
+    # How long a job's status stays visible to other workers (WORKERS > 1)
+    JOB_STATE_TTL = int(os.getenv("JOB_STATE_TTL", "3600"))
+    # Playground sessions: evicted after this many idle seconds, or LRU beyond the cap
+    PLAYGROUND_SESSION_IDLE_TTL = float(os.getenv("PLAYGROUND_SESSION_IDLE_TTL", "1800"))
+    PLAYGROUND_MAX_SESSIONS = int(os.getenv("PLAYGROUND_MAX_SESSIONS", "100"))
+    # Per-client WebSocket outbound queue; overflow policy is drop_oldest, coalesce or disconnect
+    WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "coalesce")
+    # Topics a single client may subscribe to
+    WS_MAX_SUBSCRIPTIONS = int(os.getenv("WS_MAX_SUBSCRIPTIONS", "256"))
+    # Realtime heartbeat: check interval, idle timeout (0 disables) and stuck-send timeout
+    # in seconds; uvicorn additionally sends protocol pings every WS_PING_INTERVAL, which
+    # already closes half-open sockets. App-level pings are only sent while the idle timeout
+    # is set; it is off by default because listen-only clients (the released app) never
+    # answer them and refetch on every frame
+    WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "30"))
+    WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "0"))
+    WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "30"))
+    # Recent realtime events kept for clients resuming with ?since=<seq>
+    WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", "1000"))
+    # Longest batching window a client may request with ?batch=<ms>
+    WS_BATCH_MAX_MS = int(os.getenv("WS_BATCH_MAX_MS", "1000"))
+    # Negotiate permessage-deflate compression on WebSocket connections
+    WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() in ("1", "true", "yes")
+    # Events buffered for the server loop, and how many are delivered per loop callback
+    EVENT_BUS_MAX_PENDING = int(os.getenv("EVENT_BUS_MAX_PENDING", "10000"))
+    EVENT_BUS_BATCH_SIZE = int(os.getenv("EVENT_BUS_BATCH_SIZE", "256"))
 
 config = Config()
@@ -1,28 +1,75 @@
-import uvicorn
 import threading
 import time
 import asyncio
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .config import config
-from .middleware.rate_limit import RateLimitMiddleware
+from .middleware.rate_limit import RateLimitMiddleware, parse_route_limits
 from .api import routes, websocket
 from .api import ide_routes
-from .api.routes import seed_mock_agents
+from .api.routes import ensure_state_loaded, load_state
 from .services.event_listener import get_event_listener
 from .api.websocket import get_connection_manager
 from .services.auth import get_auth_service
+from .services.persistence import get_persistence_writer
+from .services.llm import get_llm_client
+from .services.job_queue import get_job_queue
+from .services.event_bus import get_event_bus
+from .services.agent_registry import AgentRegistry
+from .services.state_backend import KIND_AGENT, KIND_EVENT, KIND_JOB, KIND_WORKSPACE, applying_remote, get_state_backend
+from .models.agent_model import Agent
 import os
 
+def _warm_up():
+    """Load persisted agents and build the LLM providers (importing their SDKs) off the request path."""
+    load_state()
+    get_llm_client().reload()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop = asyncio.get_running_loop()
+    # Events from hook threads are delivered on this loop from here on
+    get_event_bus().attach(loop)
+    get_connection_manager().start()
+    # Apply changes made by other workers
+    get_state_backend().start(app.state.extension.on_remote_state)
+    # Requests that arrive before this finishes wait in ensure_state_loaded
+    warm_up = loop.run_in_executor(None, _warm_up)
+    yield
+    try:
+        await warm_up
+    except Exception as e:
+        print(f"[MobileBridge] Warm-up failed: {e}")
+    get_state_backend().stop()
+    get_event_bus().detach()
+    await get_connection_manager().stop()
+    await get_job_queue().stop()
+    await get_llm_client().aclose()
+    # Flush buffered agent/log writes before the process goes away
+    get_persistence_writer().stop()
+
 # Defines the Extension class expected by Antigravity
 class MobileBridgeExtension:
     def __init__(self):
         self.server_thread = None
         self.should_exit = False
-        self.app = FastAPI(title="MobileBridge API")
+        self.app = FastAPI(title="MobileBridge API", lifespan=lifespan)
+        # The lifespan works with the instance that owns the app, which is
+        # not always the get_extension() one (the entry point builds its own)
+        self.app.state.extension = self
 
         # Rate Limiting
-        self.app.add_middleware(RateLimitMiddleware, requests_per_minute=60)
+        self.app.add_middleware(
+            RateLimitMiddleware,
+            requests_per_minute=config.RATE_LIMIT_PER_MINUTE,
+            route_limits=parse_route_limits(config.RATE_LIMIT_ROUTES),
+            requests_per_token=config.RATE_LIMIT_PER_TOKEN,
+            verify_token=get_auth_service().verify_token,
+            trusted_proxies=config.TRUSTED_PROXIES.split(","),
+            max_clients=config.RATE_LIMIT_MAX_CLIENTS,
+        )
         
         # Determine allowed origins
         allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*").split(",")
@@ -36,37 +83,82 @@ class MobileBridgeExtension:
             allow_headers=["*"],
         )
         
-        # Setup Routes
-        self.app.include_router(routes.router)
+        # Setup Routes; HTTP routes wait for persisted agents on first use
+        loaded = [Depends(ensure_state_loaded)]
+        self.app.include_router(routes.router, dependencies=loaded)
         self.app.include_router(websocket.router)
-        self.app.include_router(ide_routes.router)
+        self.app.include_router(ide_routes.router, dependencies=loaded)
         
         # Link Event Listener to WebSocket
         self.event_listener = get_event_listener()
         self.connection_manager = get_connection_manager()
         
-        # The broadcast needs to happen on the loop where the websocket is running.
-        # Since uvicorn runs in its own thread/loop, we need a way to bridge this.
-        # For this implementation, we will assume the event callbacks might come from a different thread.
-        # We can implement a simple async bridge if we were sharing the loop, 
-        # but here we'll just let the websocket manager handle the broadcast which is async.
-        # Ideally, we'd use a queue or similar if loops are different.
-        
-        # For simplicity in this extension pattern, we inject the broadcast method
-        # NOTE: This simple assignment assumes thread-safety on the loop or that uvicorn handles it.
-        # In a robust prod env, use `call_soon_threadsafe`.
-        self.event_listener.set_broadcast_callback(self.connection_manager.broadcast)
-        
-        # Seed demo agents on startup
-        seed_mock_agents()
+        # Hooks may fire on any thread; the bus marshals their events onto
+        # the uvicorn loop, where the connection manager delivers them
+        self.event_bus = get_event_bus()
+        self.event_bus.set_sink(self._deliver_event)
+        self.event_listener.set_broadcast_callback(self.event_bus.publish)
+        # Shared with other workers when running more than one
+        self.state = get_state_backend()
+        # Agent changes feed the delta stream for batching clients
+        AgentRegistry.get_instance().add_listener(self._on_agent_changed)
+
+    def _on_agent_changed(self, agent_id: str, agent):
+        # Snapshot on the calling thread; the agent may be mutated after this returns
+        state = agent.model_dump(mode="json") if agent is not None else None
+        self.event_bus.call(self.connection_manager.agent_changed, agent_id, state)
+        if not applying_remote():
+            self.state.publish(KIND_AGENT, {"id": agent_id, "agent": state})
+
+    def _deliver_event(self, message: str, key, topics):
+        """Bus sink: deliver to this worker's clients and fan out to the other workers."""
+        self.connection_manager.publish(message, key, topics)
+        self.state.publish(KIND_EVENT, {"message": message, "key": key, "topics": topics})
+
+    def on_remote_state(self, kind: str, payload: dict):
+        """Apply a change published by another worker. Runs on the state backend thread."""
+        registry = AgentRegistry.get_instance()
+        if kind == KIND_AGENT:
+            if payload["agent"] is None:
+                registry.remove_agent(payload["id"])
+            else:
+                registry.update_agent(Agent(**payload["agent"]))
+        elif kind == KIND_EVENT:
+            self.event_bus.call(self.connection_manager.publish, payload["message"], payload["key"], payload["topics"])
+        elif kind == KIND_WORKSPACE:
+            if payload.get("env"):
+                os.environ["ANTONE_WORKSPACE"] = payload["env"]
+            if payload.get("current"):
+                routes._set_workspace(payload["current"], share=False)
+        elif kind == KIND_JOB:
+            self.event_bus.call(routes._cancel_remote_job, payload["cancel"])
 
     def start_server(self):
+        # Only needed to serve; importing the extension should not pay for it
+        import uvicorn
         auth_service = get_auth_service()
         print(f"\n[MobileBridge] 🚀 Starting server on http://{config.HOST}:{config.PORT}")
         print(f"[MobileBridge] 🔑 Pairing Key: {auth_service.get_pairing_key()}")
         print(f"[MobileBridge] Use this key to pair your mobile app.\n")
         
-        uvicorn.run(self.app, host=config.HOST, port=config.PORT, log_level="info")
+        options = dict(host=config.HOST, port=config.PORT, log_level="info",
+                       ws_per_message_deflate=config.WS_PER_MESSAGE_DEFLATE,
+                       ws_ping_interval=config.WS_PING_INTERVAL or None,
+                       ws_ping_timeout=config.WS_PING_INTERVAL or None)
+        workers = config.WORKERS
+        if workers > 1 and not self.state.shared:
+            print("[MobileBridge] WORKERS > 1 needs STATE_BACKEND=sqlite; running a single worker.")
+            workers = 1
+        if workers > 1 and config.STORAGE_BACKEND != "sqlite":
+            # The JSON journal/snapshot and log segment files are owned by one
+            # process: each worker would compact and number logs on its own
+            print("[MobileBridge] WORKERS > 1 needs STORAGE_BACKEND=sqlite; running a single worker.")
+            workers = 1
+        if workers > 1:
+            # Each worker process imports this module and builds its own app
+            uvicorn.run("mobile_bridge.extension_entry:create_app", factory=True, workers=workers, **options)
+        else:
+            uvicorn.run(self.app, **options)
 
     def on_load(self):
         """Called when Antigravity loads the extension."""
@@ -82,16 +174,36 @@ class MobileBridgeExtension:
     def on_unload(self):
         """Called when Antigravity unloads the extension."""
         print("[MobileBridge] Stopping server...")
+        get_persistence_writer().stop()
         # Uvicorn doesn't have a clean "stop" from another thread easily without signal handlers
         # but since it's a daemon thread, it will die with the main process.
         # For graceful shutdown in a real app, we'd set a flag or use uvicorn Server object control.
         print("[MobileBridge] Extension unloaded.")
 
-# Entry point instance
-extension = MobileBridgeExtension()
+# Entry point instance, built on first use rather than at import
+_extension: Optional[MobileBridgeExtension] = None
+_extension_lock = threading.Lock()
+
+def get_extension() -> MobileBridgeExtension:
+    global _extension
+    if _extension is None:
+        with _extension_lock:
+            if _extension is None:
+                _extension = MobileBridgeExtension()
+    return _extension
+
+def __getattr__(name):
+    # `extension` used to be created at import; keep it importable
+    if name == "extension":
+        return get_extension()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_app() -> FastAPI:
+    """App factory used by uvicorn worker processes."""
+    return get_extension().app
 
 def load_extension():
-    extension.on_load()
+    get_extension().on_load()
 
 def unload_extension():
-    extension.on_unload()
+    get_extension().on_unload()
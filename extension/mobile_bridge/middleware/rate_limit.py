@@ -1,34 +1,184 @@
+"""
+Token-bucket rate limiting as plain ASGI middleware.
+
+Each client gets a bucket holding up to one minute's worth of requests
+that refills continuously, so state per client is two floats no matter
+how busy it is. Buckets live in an LRU table bounded by size, and buckets
+idle longer than `idle_ttl` are dropped (a bucket idle that long would be
+full again anyway).
+
+A request is charged to:
+- its client IP's default bucket,
+- the IP's bucket for the longest matching route prefix in `route_limits`,
+- its bearer token's bucket when `requests_per_token` is set. Only tokens
+  that pass `verify_token` get one, keyed by their SHA-256 digest, so
+  random tokens cannot fill the table and raw tokens are never kept.
+
+It is rejected with 429 and Retry-After if any of them is empty, and then
+none of them is charged.
+
+The client IP is the socket peer unless the peer is a trusted proxy, in
+which case X-Real-IP (set by our nginx config) or the nearest untrusted
+X-Forwarded-For hop is used.
+"""
 import time
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict, deque
+import hashlib
+import ipaddress
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Never limited
+EXEMPT_PATHS = {"/health"}
+
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, requests_per_minute: int = 60):
-        super().__init__(app)
+def parse_route_limits(spec: str) -> Dict[str, int]:
+    """Parse "prefix=rpm,prefix=rpm" into {prefix: requests_per_minute}."""
+    limits = {}
+    for item in spec.split(","):
+        prefix, _, rpm = item.strip().partition("=")
+        if prefix.strip() and rpm.strip().isdigit() and int(rpm) > 0:
+            limits[prefix.strip()] = int(rpm)
+    return limits
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        requests_per_minute: int = 60,
+        route_limits: Optional[Dict[str, int]] = None,
+        requests_per_token: int = 0,
+        verify_token: Optional[Callable[[str], Any]] = None,
+        trusted_proxies: Iterable[str] = (),
+        max_clients: int = 10000,
+        idle_ttl: float = 600,
+    ):
+        self.app = app
         self.limit = requests_per_minute
-        # Dict to store request timestamps per IP
-        # Value is a deque of timestamps
-        self.request_history = defaultdict(deque)
-
-    async def dispatch(self, request: Request, call_next):
-        # Allow health checks and websocket upgrades without rate limiting for now
-        if request.url.path == "/health" or request.url.path == "/ws":
-            return await call_next(request)
-
-        client_ip = request.client.host if request.client else "unknown"
-        now = time.time()
-        
-        # Clean up old timestamps
-        history = self.request_history[client_ip]
-        while history and history[0] < now - 60:
-            history.popleft()
-
-        if len(history) >= self.limit:
-            return Response("Too Many Requests", status_code=429)
-
-        history.append(now)
-        
-        # Process request
-        response = await call_next(request)
-        return response
+        # Longest prefix first so the most specific rule wins
+        self.route_limits: List[Tuple[str, int]] = sorted((route_limits or {}).items(), key=lambda r: -len(r[0]))
+        self.token_limit = requests_per_token
+        # Raises for invalid tokens (AuthService.verify_token, which caches successes)
+        self.verify_token = verify_token
+        self.trusted_proxies = [ipaddress.ip_network(p.strip(), strict=False) for p in trusted_proxies if p.strip()]
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        # key -> [tokens, last refill]; least recently used first
+        self._buckets: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.rejected = 0
+        global _rate_limiter
+        _rate_limiter = self
+
+    async def __call__(self, scope, receive, send):
+        # WebSocket upgrades and lifespan events pass straight through
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        client_ip = self._client_ip(scope, headers)
+        now = time.monotonic()
+        self._sweep(now)
+
+        checks = [(("ip", client_ip), self.limit)]
+        for prefix, rpm in self.route_limits:
+            if scope["path"].startswith(prefix):
+                checks.append((("route", client_ip, prefix), rpm))
+                break
+        if self.token_limit > 0 and self.verify_token is not None:
+            token = self._bearer_token(headers)
+            if token and self._verified(token):
+                checks.append((("token", hashlib.sha256(token.encode()).digest()), self.token_limit))
+
+        buckets = [(self._refill(key, rpm, now), rpm) for key, rpm in checks if rpm > 0]
+        waits = [(1 - bucket[0]) * 60 / rpm for bucket, rpm in buckets if bucket[0] < 1]
+        if waits:
+            self.rejected += 1
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"retry-after", str(max(1, round(max(waits)))).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b"Too Many Requests"})
+            return
+
+        for bucket, _ in buckets:
+            bucket[0] -= 1
+        await self.app(scope, receive, send)
+
+    def _verified(self, token: str) -> bool:
+        try:
+            self.verify_token(token)
+            return True
+        except Exception:
+            # The route's own auth rejects it; only the IP buckets apply
+            return False
+
+    def _refill(self, key: tuple, rpm: int, now: float) -> List[float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(rpm), now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(float(rpm), bucket[0] + (now - bucket[1]) * rpm / 60)
+            bucket[1] = now
+        return bucket
+
+    def _sweep(self, now: float):
+        """Drop buckets idle for longer than idle_ttl; they are ordered by last use."""
+        if now - self._last_sweep < self.idle_ttl / 10:
+            return
+        self._last_sweep = now
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+    def _trusted(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    def _client_ip(self, scope, headers: Dict[bytes, bytes]) -> str:
+        peer = scope["client"][0] if scope.get("client") else "unknown"
+        if not self._trusted(peer):
+            return peer
+        real_ip = headers.get(b"x-real-ip")
+        if real_ip:
+            return real_ip.decode("latin-1").strip()
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            # Walk back from the hop closest to us until one we do not trust
+            hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+            for hop in reversed(hops):
+                if not self._trusted(hop):
+                    return hop
+        return peer
+
+    @staticmethod
+    def _bearer_token(headers: Dict[bytes, bytes]) -> Optional[str]:
+        value = headers.get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = value.partition(" ")
+        if scheme.lower() != "bearer":
+            return None
+        return token.strip() or None
+
+    def stats(self) -> dict:
+        return {"clients": len(self._buckets), "rejected": self.rejected}
+
+
+_rate_limiter: Optional[RateLimitMiddleware] = None
+
+
+def get_rate_limiter() -> Optional[RateLimitMiddleware]:
+    """The app's rate limiter, once the middleware stack has been built."""
+    return _rate_limiter
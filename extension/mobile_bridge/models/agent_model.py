@@ -36,3 +36,5 @@ class PlaygroundRequest(BaseModel):
     user_prompt: str
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 1000
+    # Continue a playground session; requests without one share "playground-main"
+    session_id: Optional[str] = None
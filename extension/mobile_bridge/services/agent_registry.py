@@ -1,35 +1,150 @@
 import threading
-from typing import Dict, List, Optional
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from ..models.agent_model import Agent, AgentStatus
 
-class AgentRegistry:
-    _instance = None
-    _lock = threading.Lock()
+# Index keys an agent was filed under: (status, workspace)
+_IndexKey = Tuple[AgentStatus, Optional[str]]
+
+
+class _Shard:
+    """A slice of the agents with its own lock, indexes, counters and snapshot."""
+
+    __slots__ = ("lock", "agents", "keys", "by_status", "by_workspace", "status_counts", "snapshot")
 
     def __init__(self):
+        self.lock = threading.Lock()
         self.agents: Dict[str, Agent] = {}
+        # Agents are mutated in place before update_agent, so the keys they
+        # were indexed under are kept separately
+        self.keys: Dict[str, _IndexKey] = {}
+        self.by_status: Dict[AgentStatus, Set[str]] = {}
+        self.by_workspace: Dict[Optional[str], Set[str]] = {}
+        self.status_counts: Counter = Counter()
+        # List of the shard's agents, dropped on every write
+        self.snapshot: Optional[List[Agent]] = None
+
+    def index(self, agent_id: str, key: _IndexKey):
+        """Caller holds the lock."""
+        status, workspace = key
+        self.by_status.setdefault(status, set()).add(agent_id)
+        self.by_workspace.setdefault(workspace, set()).add(agent_id)
+        self.status_counts[status] += 1
+
+    def unindex(self, agent_id: str, key: _IndexKey):
+        """Caller holds the lock."""
+        status, workspace = key
+        for index, value in ((self.by_status, status), (self.by_workspace, workspace)):
+            ids = index.get(value)
+            if ids is not None:
+                ids.discard(agent_id)
+                if not ids:
+                    del index[value]
+        self.status_counts[status] -= 1
+
+
+class AgentRegistry:
+    """Thread-safe agent registry.
+
+    Agents are spread over lock-striped shards, so writers to different
+    agents rarely contend. Each shard keeps secondary indexes by status and
+    workspace, per-status counters and a snapshot of its agents, all
+    maintained under its own lock; reads add the shards up, which keeps
+    counts O(shards) and filtered lookups proportional to the result.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, shards: int = 16):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._listeners: List[Callable[[str, Optional[Agent]], None]] = []
+
+    def add_listener(self, listener: Callable[[str, Optional[Agent]], None]):
+        """Register a callback invoked as (agent_id, agent) on every change; agent is None on removal."""
+        self._listeners.append(listener)
+
+    def _notify(self, agent_id: str, agent: Optional[Agent]):
+        for listener in self._listeners:
+            listener(agent_id, agent)
 
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            with cls._lock:
+            with cls._instance_lock:
                 if cls._instance is None:
                     cls._instance = cls()
         return cls._instance
 
+    def _shard(self, agent_id: str) -> _Shard:
+        return self._shards[hash(agent_id) % len(self._shards)]
+
+    # ─── Reads ───────────────────────────────────────────────────────────────
+
     def get_all(self) -> List[Agent]:
-        with self._lock:
-            return list(self.agents.values())
+        agents: List[Agent] = []
+        for shard in self._shards:
+            with shard.lock:
+                if shard.snapshot is None:
+                    shard.snapshot = list(shard.agents.values())
+                agents.extend(shard.snapshot)
+        return agents
 
     def get_agent(self, agent_id: str) -> Optional[Agent]:
-        with self._lock:
-            return self.agents.get(agent_id)
+        shard = self._shard(agent_id)
+        with shard.lock:
+            return shard.agents.get(agent_id)
+
+    def get_by_status(self, status: AgentStatus) -> List[Agent]:
+        agents: List[Agent] = []
+        for shard in self._shards:
+            with shard.lock:
+                agents.extend(shard.agents[agent_id] for agent_id in shard.by_status.get(status, ()))
+        return agents
+
+    def get_by_workspace(self, workspace: Optional[str]) -> List[Agent]:
+        agents: List[Agent] = []
+        for shard in self._shards:
+            with shard.lock:
+                agents.extend(shard.agents[agent_id] for agent_id in shard.by_workspace.get(workspace, ()))
+        return agents
+
+    def count(self, status: Optional[AgentStatus] = None) -> int:
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                total += len(shard.agents) if status is None else shard.status_counts[status]
+        return total
+
+    def status_counts(self) -> Dict[str, int]:
+        counts: Counter = Counter()
+        for shard in self._shards:
+            with shard.lock:
+                counts.update(shard.status_counts)
+        return {status.value: counts[status] for status in AgentStatus}
+
+    # ─── Writes ──────────────────────────────────────────────────────────────
 
     def update_agent(self, agent: Agent):
-        with self._lock:
-            self.agents[agent.id] = agent
+        shard = self._shard(agent.id)
+        key = (agent.status, agent.workspace)
+        with shard.lock:
+            old_key = shard.keys.get(agent.id)
+            shard.agents[agent.id] = agent
+            shard.keys[agent.id] = key
+            if old_key != key:
+                if old_key is not None:
+                    shard.unindex(agent.id, old_key)
+                shard.index(agent.id, key)
+            shard.snapshot = None
+        self._notify(agent.id, agent)
 
     def remove_agent(self, agent_id: str):
-        with self._lock:
-            if agent_id in self.agents:
-                del self.agents[agent_id]
+        shard = self._shard(agent_id)
+        with shard.lock:
+            if agent_id not in shard.agents:
+                return
+            del shard.agents[agent_id]
+            shard.unindex(agent_id, shard.keys.pop(agent_id))
+            shard.snapshot = None
+        self._notify(agent_id, None)
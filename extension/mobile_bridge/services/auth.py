@@ -1,19 +1,53 @@
 import os
+import time
 import secrets
+import hashlib
+import threading
 import jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from ..config import config
+from .state_backend import get_state_backend
 
 security = HTTPBearer()
 
 class AuthService:
-    def __init__(self):
+    def __init__(self, cache_size: int = 1024):
+        # Verified tokens by SHA-256 digest -> (claims, exp), least recently used first.
+        # Polling clients present the same token on every request, so this skips
+        # jwt.decode for all but the first one
+        self.cache_size = cache_size
+        self._verified: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        backend = get_state_backend()
+        # Workers must agree on the signing secret; a random default is
+        # generated per process, so the first worker's one is shared
+        if backend.shared and not (os.getenv("MOBILE_BRIDGE_JWT_SECRET") or os.getenv("JWT_SECRET")):
+            self.secret = backend.setdefault("jwt_secret", config.JWT_SECRET)
+        else:
+            self.secret = config.JWT_SECRET
         self.pairing_key = self._load_or_generate_pairing_key()
 
+    @property
+    def secret(self) -> str:
+        return self._secret
+
+    @secret.setter
+    def secret(self, value: str):
+        # Tokens verified with the old secret must be checked again
+        self._secret = value
+        self.clear_token_cache()
+
+    def clear_token_cache(self):
+        with self._cache_lock:
+            self._verified.clear()
+
     def _load_or_generate_pairing_key(self) -> str:
-        return secrets.token_urlsafe(16)
+        return get_state_backend().setdefault("pairing_key", secrets.token_urlsafe(16))
 
     def get_pairing_key(self) -> str:
         return self.pairing_key
@@ -23,18 +57,46 @@ class AuthService:
             "sub": "mobile_app",
             "exp": datetime.utcnow() + timedelta(days=365) # Long lived for now
         }
-        return jwt.encode(payload, config.JWT_SECRET, algorithm=config.JWT_ALGORITHM)
+        return jwt.encode(payload, self.secret, algorithm=config.JWT_ALGORITHM)
 
     def verify_token(self, token: str) -> dict:
+        if self.cache_size <= 0:
+            return self._decode(token)
+        digest = hashlib.sha256(token.encode()).digest()
+        with self._cache_lock:
+            cached = self._verified.get(digest)
+            if cached is not None:
+                claims, exp = cached
+                if exp is None or exp > time.time():
+                    self._verified.move_to_end(digest)
+                    self.cache_hits += 1
+                    return dict(claims)
+                del self._verified[digest]
+            self.cache_misses += 1
+        secret = self.secret
+        claims = self._decode(token)
+        with self._cache_lock:
+            # Skip caching if the secret rotated while decoding
+            if secret == self._secret:
+                self._verified[digest] = (claims, claims.get("exp"))
+                if len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+        return dict(claims)
+
+    def _decode(self, token: str) -> dict:
         try:
-            payload = jwt.decode(token, config.JWT_SECRET, algorithms=[config.JWT_ALGORITHM])
+            payload = jwt.decode(token, self.secret, algorithms=[config.JWT_ALGORITHM])
             return payload
         except jwt.ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token expired")
         except jwt.InvalidTokenError:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-_auth_service = AuthService()
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            return {"size": len(self._verified), "hits": self.cache_hits, "misses": self.cache_misses}
+
+_auth_service = AuthService(cache_size=config.AUTH_TOKEN_CACHE_SIZE)
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
     token = credentials.credentials
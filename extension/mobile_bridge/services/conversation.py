@@ -0,0 +1,112 @@
+"""
+Token-budgeted conversation context for multi-turn agent loops.
+
+Turns are kept as a structured message list rather than one growing prompt
+string. When the estimated token count exceeds the budget, the oldest turns
+are folded into a short extractive summary (no extra LLM call), so prompt
+size stays bounded however long the loop runs.
+"""
+from typing import Dict, List, Union
+
+ROLE_SYSTEM = "system"
+ROLE_USER = "user"
+ROLE_ASSISTANT = "assistant"
+# Tool results; sent to chat APIs as user messages
+ROLE_TOOL = "tool"
+
+Message = Dict[str, str]
+Prompt = Union[str, List[Message]]
+
+_LABELS = {ROLE_USER: "User", ROLE_ASSISTANT: "Agent", ROLE_TOOL: "System"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); avoids a tokenizer dependency."""
+    return len(text) // 4 + 1
+
+
+def as_chat_messages(prompt: Prompt) -> List[Message]:
+    """Messages in the OpenAI-style chat format used by NVIDIA NIM."""
+    if isinstance(prompt, str):
+        return [{"role": ROLE_USER, "content": prompt}]
+    return [
+        {"role": ROLE_USER, "content": f"System: {m['content']}"} if m["role"] == ROLE_TOOL else m
+        for m in prompt
+    ]
+
+
+def render(prompt: Prompt) -> str:
+    """Flatten messages into a single transcript prompt ending with the agent's turn."""
+    if isinstance(prompt, str):
+        return prompt
+    parts = []
+    for m in prompt:
+        if m["role"] == ROLE_SYSTEM:
+            parts.append(f"{m['content']}\n")
+        else:
+            parts.append(f"{_LABELS[m['role']]}: {m['content']}")
+    parts.append("Agent:")
+    return "\n".join(parts)
+
+
+class Conversation:
+    def __init__(self, system_prompt: str, budget_tokens: int = 6000, keep_recent: int = 4,
+                 summary_line_chars: int = 160):
+        self.system_prompt = system_prompt
+        self.budget_tokens = budget_tokens
+        # Most recent turns that are never evicted
+        self.keep_recent = keep_recent
+        self.summary_line_chars = summary_line_chars
+        self.turns: List[Message] = []
+        self.summary: List[str] = []
+        self._tokens = estimate_tokens(system_prompt)
+
+    def set_system_prompt(self, system_prompt: str):
+        self._tokens += estimate_tokens(system_prompt) - estimate_tokens(self.system_prompt)
+        self.system_prompt = system_prompt
+        self._fit()
+
+    def add(self, role: str, content: str):
+        self.turns.append({"role": role, "content": content})
+        self._tokens += estimate_tokens(content)
+        self._fit()
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens + sum(estimate_tokens(line) for line in self.summary)
+
+    def _fit(self):
+        while self.tokens > self.budget_tokens and len(self.turns) > self.keep_recent:
+            turn = self.turns.pop(0)
+            self._tokens -= estimate_tokens(turn["content"])
+            text = " ".join(turn["content"].split())
+            if len(text) > self.summary_line_chars:
+                text = text[:self.summary_line_chars] + "..."
+            self.summary.append(f"- {_LABELS[turn['role']]}: {text}")
+        # The summary itself must fit too; drop its oldest lines first
+        while self.tokens > self.budget_tokens and self.summary:
+            self.summary.pop(0)
+
+    def to_dict(self) -> Dict:
+        return {
+            "system_prompt": self.system_prompt,
+            "budget_tokens": self.budget_tokens,
+            "keep_recent": self.keep_recent,
+            "summary_line_chars": self.summary_line_chars,
+            "turns": self.turns,
+            "summary": self.summary,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Conversation":
+        conversation = cls(data["system_prompt"], data["budget_tokens"], data["keep_recent"], data["summary_line_chars"])
+        conversation.summary = list(data["summary"])
+        for turn in data["turns"]:
+            conversation.add(turn["role"], turn["content"])
+        return conversation
+
+    def messages(self) -> List[Message]:
+        system = self.system_prompt
+        if self.summary:
+            system += "\n\nSummary of earlier conversation:\n" + "\n".join(self.summary)
+        return [{"role": ROLE_SYSTEM, "content": system}] + list(self.turns)
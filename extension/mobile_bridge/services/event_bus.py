@@ -0,0 +1,111 @@
+"""
+Thread-safe bridge from event producers into the server's event loop.
+
+Antigravity hooks may fire on any thread, while WebSocket delivery must
+happen on the uvicorn loop. publish() only appends to a bounded buffer and,
+for the first event of a burst, schedules a drain on the loop with
+call_soon_threadsafe; producers never block and never touch loop state.
+The drain hands events to the sink in batches, yielding to the loop
+between batches so a flood of events cannot starve request handling.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+Sink = Callable[[str, Optional[str], Optional[List[str]]], None]
+# A callback and its arguments, run on the loop
+_Event = Tuple[Callable[..., Any], tuple]
+
+
+class EventBus:
+    def __init__(self, max_pending: int = 10000, batch_size: int = 256):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending: Deque[_Event] = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sink: Optional[Sink] = None
+        self._scheduled = False
+        self.published = 0
+        self.dropped = 0
+
+    def set_sink(self, sink: Sink):
+        """Set the delivery callback; it is always invoked on the attached loop."""
+        self._sink = sink
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Start delivering on `loop`. Events published before this are delivered now."""
+        with self._lock:
+            self._loop = loop
+            self._scheduled = False
+        self._schedule()
+
+    def detach(self):
+        with self._lock:
+            self._loop = None
+            self._scheduled = False
+
+    def publish(self, message: str, key: Optional[str] = None, topics: Optional[List[str]] = None):
+        """Queue an event for delivery. Safe to call from any thread; never blocks on I/O."""
+        self.call(self._deliver, message, key, topics)
+
+    def call(self, callback: Callable[..., Any], *args):
+        """Run `callback(*args)` on the loop, in order with published events. Thread-safe."""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                # Consumers are far behind; the oldest events are the least useful
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append((callback, args))
+            self.published += 1
+        self._schedule()
+
+    def _deliver(self, message: str, key: Optional[str], topics: Optional[List[str]]):
+        if self._sink:
+            self._sink(message, key, topics)
+
+    def _schedule(self):
+        with self._lock:
+            if self._scheduled or self._loop is None or not self._pending:
+                return
+            self._scheduled = True
+            loop = self._loop
+        try:
+            loop.call_soon_threadsafe(self._drain)
+        except RuntimeError:
+            # Loop already closed (shutdown)
+            with self._lock:
+                self._scheduled = False
+
+    def _drain(self):
+        """Deliver up to one batch; runs on the loop."""
+        with self._lock:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        for callback, args in batch:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error delivering event: {e}")
+        with self._lock:
+            more = bool(self._pending) and self._loop is not None
+            self._scheduled = more
+            loop = self._loop
+        if more:
+            # Let other callbacks run before the next batch
+            loop.call_soon(self._drain)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "published": self.published, "dropped": self.dropped}
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    global _event_bus
+    if _event_bus is None:
+        from ..config import config
+        _event_bus = EventBus(max_pending=config.EVENT_BUS_MAX_PENDING, batch_size=config.EVENT_BUS_BATCH_SIZE)
+    return _event_bus
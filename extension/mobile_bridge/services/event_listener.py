@@ -1,20 +1,28 @@
 import asyncio
-from typing import Dict, Any, Callable
+import inspect
+from typing import Dict, Any, Callable, List, Optional
 from datetime import datetime
 from ..models.agent_model import Agent, AgentStatus, AgentEvent
 from .agent_registry import AgentRegistry
+from .subscriptions import event_topics
 
 class EventListener:
     def __init__(self):
         self.registry = AgentRegistry.get_instance()
         self.broadcast_callback = None
 
-    def set_broadcast_callback(self, callback: Callable[[Dict], Any]):
+    def set_broadcast_callback(self, callback: Callable[[str, Optional[str], List[str]], Any]):
         self.broadcast_callback = callback
 
-    async def _broadcast(self, event: AgentEvent):
+    async def _broadcast(self, event: AgentEvent, key: Optional[str] = None):
+        """Send an event to clients. Events sharing a `key` report the same state,
+        so a client that is behind only needs the latest one."""
         if self.broadcast_callback:
-            await self.broadcast_callback(event.model_dump_json())
+            agent = self.registry.get_agent(event.agent_id)
+            topics = event_topics(event.agent_id, event.event_type, agent.workspace if agent else None)
+            result = self.broadcast_callback(event.model_dump_json(), key, topics)
+            if inspect.isawaitable(result):
+                await result
 
     # Mock hooks - in a real extension these would be decorated with Antigravity hooks
     async def on_agent_started(self, agent_id: str, name: str, meta: Dict[str, Any] = {}):
@@ -26,7 +34,7 @@ class EventListener:
             meta=meta
         )
         self.registry.update_agent(agent)
-        await self._broadcast(AgentEvent(event_type="agent_started", agent_id=agent_id, timestamp=datetime.now(), payload=meta))
+        await self._broadcast(AgentEvent(event_type="agent_started", agent_id=agent_id, timestamp=datetime.now(), payload=meta), key=f"agent:{agent_id}")
 
     async def on_agent_stopped(self, agent_id: str):
         agent = self.registry.get_agent(agent_id)
@@ -34,7 +42,7 @@ class EventListener:
             agent.status = AgentStatus.STOPPED
             agent.last_active = datetime.now()
             self.registry.update_agent(agent)
-            await self._broadcast(AgentEvent(event_type="agent_stopped", agent_id=agent_id, timestamp=datetime.now(), payload={}))
+            await self._broadcast(AgentEvent(event_type="agent_stopped", agent_id=agent_id, timestamp=datetime.now(), payload={}), key=f"agent:{agent_id}")
 
     async def on_task_completed(self, agent_id: str, task_result: Dict[str, Any]):
         agent = self.registry.get_agent(agent_id)
@@ -51,7 +59,7 @@ class EventListener:
             agent.last_active = datetime.now()
             agent.meta["last_error"] = error
             self.registry.update_agent(agent)
-            await self._broadcast(AgentEvent(event_type="agent_error", agent_id=agent_id, timestamp=datetime.now(), payload={"error": error}))
+            await self._broadcast(AgentEvent(event_type="agent_error", agent_id=agent_id, timestamp=datetime.now(), payload={"error": error}), key=f"agent:{agent_id}")
 
     async def on_approval_required(self, agent_id: str, details: str):
         agent = self.registry.get_agent(agent_id)
@@ -59,7 +67,13 @@ class EventListener:
             agent.status = AgentStatus.WAITING_APPROVAL
             agent.last_active = datetime.now()
             self.registry.update_agent(agent)
-            await self._broadcast(AgentEvent(event_type="approval_required", agent_id=agent_id, timestamp=datetime.now(), payload={"details": details}))
+            await self._broadcast(AgentEvent(event_type="approval_required", agent_id=agent_id, timestamp=datetime.now(), payload={"details": details}), key=f"agent:{agent_id}")
+
+    async def on_job_event(self, job_id: str, agent_id: str, event: Dict[str, Any]):
+        """Relay background job progress ("job_status", "job_tool", "job_done", ...)."""
+        await self._broadcast(AgentEvent(event_type=f"job_{event.get('type', 'event')}", agent_id=agent_id,
+                                         timestamp=datetime.now(), payload={**event, "job_id": job_id}),
+                              key=f"job:{job_id}" if event.get("type") == "status" else None)
 
 _event_listener = EventListener()
 
@@ -0,0 +1,235 @@
+"""
+Background job queue for long-running agent work.
+
+Submitting a job returns immediately with its id; a fixed pool of asyncio
+workers picks jobs up highest priority first (FIFO within a priority),
+never running more than a set number of jobs per workspace at once. Each
+job is an async generator of events; every event, and every status change,
+is handed to a publish callback so clients can follow progress without
+holding an HTTP request open.
+"""
+import uuid
+import heapq
+import asyncio
+import itertools
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+JobRunner = Callable[["Job"], AsyncIterator[Dict[str, Any]]]
+Publisher = Callable[["Job", Dict[str, Any]], Awaitable[None]]
+
+
+class Job:
+    def __init__(self, kind: str, runner: JobRunner, workspace: str, priority: int = 0,
+                 agent_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.workspace = workspace
+        self.priority = priority
+        self.agent_id = agent_id
+        self.status = QUEUED
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._runner = runner
+        self._task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "workspace": self.workspace,
+            "agent_id": self.agent_id,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers: int = 4, per_workspace: int = 1, history: int = 200):
+        self.workers = workers
+        self.per_workspace = per_workspace
+        self.history = history
+        # Jobs by id, oldest first; finished ones beyond `history` are dropped
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # (-priority, submit order, job) heap of queued jobs
+        self._pending: List[Tuple[int, int, Job]] = []
+        self._counter = itertools.count()
+        self._running: Dict[str, int] = {}
+        self._cond: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._publish: Optional[Publisher] = None
+
+    def set_publisher(self, publish: Publisher):
+        self._publish = publish
+
+    def _start(self):
+        """Start the worker pool on the running loop the first time a job is submitted."""
+        if self._workers:
+            return
+        self._cond = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, kind: str, runner: JobRunner, workspace: str, priority: int = 0,
+                     agent_id: Optional[str] = None) -> Job:
+        self._start()
+        job = Job(kind, runner, workspace, priority, agent_id)
+        self._jobs[job.id] = job
+        self._trim()
+        async with self._cond:
+            heapq.heappush(self._pending, (-priority, next(self._counter), job))
+            self._cond.notify_all()
+        await self._emit(job, {"type": "status", "status": QUEUED})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None) -> List[Job]:
+        return [job for job in self._jobs.values() if status is None or job.status == status]
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {s: 0 for s in (QUEUED, RUNNING) + FINISHED}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {"workers": self.workers, "per_workspace": self.per_workspace, "jobs": counts}
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job. Returns None for unknown ids."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        async with self._cond:
+            queued = job.status == QUEUED
+            if queued:
+                self._pending = [item for item in self._pending if item[2] is not job]
+                heapq.heapify(self._pending)
+        if job._task:
+            # The job's own task reports the cancellation when it unwinds
+            job._task.cancel()
+        elif queued or job.status == RUNNING:
+            # Still queued, or claimed by a worker that has not started it
+            # yet; _run skips jobs that are already cancelled
+            await self._finish(job, CANCELLED)
+        return job
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        for job in self._jobs.values():
+            if job._task:
+                job._task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # ─── Workers ─────────────────────────────────────────────────────────────
+
+    def _next_job(self) -> Optional[Job]:
+        """Pop the highest priority job whose workspace has a free slot. Caller holds the condition."""
+        skipped = []
+        job = None
+        while self._pending:
+            item = heapq.heappop(self._pending)
+            if self._running.get(item[2].workspace, 0) < self.per_workspace:
+                job = item[2]
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self._pending, item)
+        return job
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                job = self._next_job()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._next_job()
+                # Claimed: cancel() must no longer treat it as queued
+                job.status = RUNNING
+                self._running[job.workspace] = self._running.get(job.workspace, 0) + 1
+            try:
+                task = job._task = asyncio.create_task(self._run(job))
+                # wait() rather than await: only this worker's own cancellation
+                # may end the loop, not the job's
+                await asyncio.wait({task})
+                if task.cancelled() and job.status not in FINISHED:
+                    # Cancelled before _run started, so it never reported it
+                    await self._finish(job, CANCELLED)
+            finally:
+                async with self._cond:
+                    self._running[job.workspace] -= 1
+                    if not self._running[job.workspace]:
+                        del self._running[job.workspace]
+                    # A workspace slot freed up; queued jobs may be runnable now
+                    self._cond.notify_all()
+
+    async def _run(self, job: Job):
+        if job.status == CANCELLED:
+            return
+        try:
+            job.started_at = datetime.now()
+            await self._emit(job, {"type": "status", "status": RUNNING})
+            async for event in job._runner(job):
+                if event.get("type") == "done":
+                    job.result = event
+                await self._emit(job, event)
+        except asyncio.CancelledError:
+            await self._finish(job, CANCELLED)
+            return
+        except Exception as e:
+            await self._finish(job, FAILED, str(e))
+            return
+        await self._finish(job, SUCCEEDED)
+
+    async def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now()
+        job._task = None
+        await self._emit(job, {"type": "status", "status": status, "error": error})
+        self._trim()
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+    async def _emit(self, job: Job, event: Dict[str, Any]):
+        if not self._publish:
+            return
+        try:
+            await self._publish(job, event)
+        except Exception as e:
+            print(f"Error publishing job event: {e}")
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        from ..config import config
+        _job_queue = JobQueue(
+            workers=config.JOB_WORKERS,
+            per_workspace=config.JOB_WORKSPACE_CONCURRENCY,
+            history=config.JOB_HISTORY,
+        )
+    return _job_queue
@@ -0,0 +1,413 @@
+"""
+Async LLM provider clients.
+
+NVIDIA NIM is called through a shared httpx.AsyncClient, so keep-alive
+connections (HTTP/2 when the `h2` package is installed) are reused across
+calls instead of paying a TCP+TLS handshake per ReAct turn. Gemini goes
+through the SDK's native async methods. Neither blocks the event loop or
+occupies an executor thread.
+
+Providers are built once per API key and reused; LLMClient.reload()
+re-reads the keys and rebuilds only the providers whose key changed.
+
+When LLM_CACHE_ENABLED is set, responses to low-temperature prompts are
+served from a ResponseCache instead of calling a provider again.
+
+A ProviderRouter tracks per-provider latency and error rates and opens a
+circuit breaker on a failing provider, so a degraded NVIDIA endpoint no
+longer costs a full timeout on every call before falling back.
+"""
+import os
+import json
+import time
+import asyncio
+import importlib.util
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import httpx
+from ..config import config
+from .llm_cache import ResponseCache
+from .persistence import get_persistence_writer
+from .provider_router import ProviderRouter
+from .conversation import Prompt, as_chat_messages, render
+
+# google.generativeai takes most of a second to import, so only check that it
+# is installed here; GeminiProvider imports it when a Gemini key is configured
+try:
+    HAS_GENAI = importlib.util.find_spec("google.generativeai") is not None
+except ImportError:
+    HAS_GENAI = False
+
+try:
+    import h2  # noqa: F401
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+
+class ProviderError(Exception):
+    """A provider call failed; the caller may fall back to another provider."""
+
+
+def _error_response(error: ProviderError) -> str:
+    message = str(error)
+    return message if message.startswith("Error") else f"Error calling LLM: {message}"
+
+
+class NvidiaProvider:
+    name = "nvidia"
+    model = "meta/llama-3.1-405b-instruct"
+
+    def __init__(self, api_key: str, base_url: str, timeout: float, http: Callable[[], httpx.AsyncClient]):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        # A per-request timeout replaces the client's, so it must carry the connect limit too
+        self.timeout = httpx.Timeout(timeout, connect=config.LLM_CONNECT_TIMEOUT)
+        self._http = http
+
+    def model_id(self, model_name: str) -> str:
+        # NIM always serves the same model regardless of what the client asked for
+        return self.model
+
+    def _request(self, prompt: Prompt, temperature: float, stream: bool):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream" if stream else "application/json",
+        }
+        payload = {
+            "model": self.model,
+            "messages": as_chat_messages(prompt),
+            "temperature": temperature,
+            "top_p": 1,
+            "max_tokens": 1024,
+            "stream": stream
+        }
+        return f"{self.base_url}/chat/completions", headers, payload
+
+    async def complete(self, prompt: Prompt, model_name: str, temperature: float) -> str:
+        url, headers, payload = self._request(prompt, temperature, stream=False)
+        try:
+            response = await self._http().post(url, headers=headers, json=payload, timeout=self.timeout)
+        except httpx.HTTPError as e:
+            raise ProviderError(f"NVIDIA Exception: {e}") from e
+        if response.status_code != 200:
+            raise ProviderError(f"NVIDIA API Error: {response.status_code} {response.text}")
+        try:
+            return response.json()['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as e:
+            raise ProviderError(f"NVIDIA Exception: malformed response ({e})") from e
+
+    async def stream(self, prompt: Prompt, model_name: str, temperature: float) -> AsyncIterator[str]:
+        url, headers, payload = self._request(prompt, temperature, stream=True)
+        try:
+            async with self._http().stream("POST", url, headers=headers, json=payload, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise ProviderError(f"NVIDIA API Error: {response.status_code} {body.decode(errors='replace')}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        except (httpx.HTTPError, ValueError, KeyError, IndexError) as e:
+            raise ProviderError(f"NVIDIA Exception: {e}") from e
+
+
+class GeminiProvider:
+    name = "gemini"
+    # Model names come from client payloads, so bound the handle cache
+    max_cached_models = 16
+
+    def __init__(self, api_key: str, timeout: float):
+        self.api_key = api_key
+        self.timeout = timeout
+        import google.generativeai as genai
+        self._genai = genai
+        # genai keeps its client configuration globally; configure once per key
+        genai.configure(api_key=api_key)
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+
+    def model_id(self, model_name: str) -> str:
+        return model_name
+
+    def _model(self, model_name: str):
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._genai.GenerativeModel(model_name)
+            self._models[model_name] = model
+            if len(self._models) > self.max_cached_models:
+                self._models.popitem(last=False)
+        else:
+            self._models.move_to_end(model_name)
+        return model
+
+    async def complete(self, prompt: Prompt, model_name: str, temperature: float) -> str:
+        try:
+            response = await self._model(model_name).generate_content_async(
+                render(prompt),
+                generation_config={"temperature": temperature},
+                request_options={"timeout": self.timeout},
+            )
+            return response.text
+        except Exception as e:
+            raise ProviderError(f"Error calling LLM: {str(e)}") from e
+
+    async def stream(self, prompt: Prompt, model_name: str, temperature: float) -> AsyncIterator[str]:
+        try:
+            response = await self._model(model_name).generate_content_async(
+                render(prompt),
+                generation_config={"temperature": temperature},
+                request_options={"timeout": self.timeout},
+                stream=True,
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise ProviderError(f"Error calling LLM: {str(e)}") from e
+
+
+class LLMClient:
+    """Entry point for LLM calls.
+
+    Providers are tried in the order chosen by the ProviderRouter (NVIDIA
+    NIM has priority, then the fastest healthy provider), falling back to
+    the next one on failure.
+    """
+
+    def __init__(self):
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loaded = False
+        self._keys: Dict[str, Optional[str]] = {}
+        # Configured providers, in priority order
+        self._providers_by_name: Dict[str, Any] = {}
+        self.router = ProviderRouter(
+            window=config.LLM_BREAKER_WINDOW,
+            error_rate=config.LLM_BREAKER_ERROR_RATE,
+            min_calls=config.LLM_BREAKER_MIN_CALLS,
+            cooldown=config.LLM_BREAKER_COOLDOWN,
+        )
+        self.cache: Optional[ResponseCache] = None
+        if config.LLM_CACHE_ENABLED:
+            self.cache = ResponseCache(
+                max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                max_bytes=config.LLM_CACHE_MAX_BYTES,
+                ttl=config.LLM_CACHE_TTL,
+                path=config.LLM_CACHE_FILE or None,
+                writer=get_persistence_writer(),
+            )
+
+    def _client(self) -> httpx.AsyncClient:
+        """Shared pooled HTTP client, bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http_loop is not loop:
+            self._http = httpx.AsyncClient(
+                http2=HAS_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=config.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(config.NVIDIA_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT),
+            )
+            self._http_loop = loop
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._http_loop = None
+
+    def reload(self) -> Dict[str, bool]:
+        """Re-read provider API keys from the environment.
+
+        Only providers whose key changed are rebuilt, so cached Gemini model
+        handles survive a reload that does not touch GEMINI_API_KEY.
+        Returns which providers were rebuilt.
+        """
+        nvidia_key = os.environ.get("NVIDIA_API_KEY")
+        gemini_key = os.environ.get("GEMINI_API_KEY")
+        changed = {
+            "nvidia": not self._loaded or nvidia_key != self._keys.get("nvidia"),
+            "gemini": not self._loaded or gemini_key != self._keys.get("gemini"),
+        }
+        providers = dict(self._providers_by_name)
+        if changed["nvidia"]:
+            providers.pop("nvidia", None)
+            if nvidia_key:
+                providers["nvidia"] = NvidiaProvider(nvidia_key, config.NVIDIA_BASE_URL, config.NVIDIA_TIMEOUT, self._client)
+        if changed["gemini"]:
+            providers.pop("gemini", None)
+            if gemini_key and HAS_GENAI:
+                providers["gemini"] = GeminiProvider(gemini_key, config.GEMINI_TIMEOUT)
+        # Keep NVIDIA ahead of Gemini in the priority order
+        self._providers_by_name = {name: providers[name] for name in ("nvidia", "gemini") if name in providers}
+        self._keys = {"nvidia": nvidia_key, "gemini": gemini_key}
+        self._loaded = True
+        return changed
+
+    def _ordered_providers(self) -> List[Any]:
+        if not self._loaded:
+            self.reload()
+        names = self.router.order(list(self._providers_by_name))
+        return [self._providers_by_name[name] for name in names]
+
+    def _unavailable(self) -> str:
+        if not HAS_GENAI and not self._keys.get("nvidia"):
+            return "Error: google-generativeai library not installed."
+        return "Error: No API Key found (Checked NVIDIA_API_KEY and GEMINI_API_KEY)."
+
+    def _cache_keys(self, providers: List[Any], prompt: Prompt, model_name: str, temperature: float) -> Dict[str, str]:
+        """Cache key per provider. Empty when caching does not apply."""
+        if self.cache is None or temperature is None or temperature > config.LLM_CACHE_MAX_TEMPERATURE:
+            return {}
+        text = prompt if isinstance(prompt, str) else json.dumps(prompt, sort_keys=True)
+        return {p.name: ResponseCache.key(p.name, p.model_id(model_name), text, temperature) for p in providers}
+
+    def _cached(self, keys: Dict[str, str]) -> Optional[str]:
+        """Look up every provider's key, counting one hit or miss for the whole call."""
+        hit = None
+        for key in keys.values():
+            hit = self.cache.get(key, count=False)
+            if hit is not None:
+                break
+        self.cache.record(hit is not None)
+        return hit
+
+    async def _attempt(self, provider, prompt: Prompt, model_name: str, temperature: float) -> str:
+        """One provider call, recorded in the router's health stats."""
+        started = time.monotonic()
+        try:
+            text = await provider.complete(prompt, model_name, temperature)
+        except ProviderError:
+            self.router.record_failure(provider.name)
+            raise
+        self.router.record_success(provider.name, time.monotonic() - started)
+        return text
+
+    async def _hedged(self, providers: List[Any], prompt: Prompt, model_name: str, temperature: float):
+        """Send to the first provider, and to the next one too if no answer arrives within
+        LLM_HEDGE_DELAY. Returns (provider, text) for the first success."""
+        remaining = list(providers)
+        pending: Dict[asyncio.Task, Any] = {}
+        last_error: Optional[ProviderError] = None
+
+        def launch():
+            provider = remaining.pop(0)
+            pending[asyncio.create_task(self._attempt(provider, prompt, model_name, temperature))] = provider
+
+        launch()
+        try:
+            while pending:
+                timeout = config.LLM_HEDGE_DELAY if remaining else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        return provider, task.result()
+                    except ProviderError as e:
+                        print(e)
+                        last_error = e
+                if not pending and remaining:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    async def complete(self, prompt: Prompt, model_name: str = "gemini-2.0-flash", temperature: float = 0.7,
+                       hedge: bool = False) -> str:
+        """Call the LLM, falling back across providers.
+
+        With `hedge` (and LLM_HEDGE_DELAY > 0) a slow first provider is
+        raced against the next one; use it for latency-critical calls.
+        """
+        providers = self._ordered_providers()
+        if not providers:
+            return self._unavailable()
+
+        keys = self._cache_keys(providers, prompt, model_name, temperature)
+        if keys:
+            hit = self._cached(keys)
+            if hit is not None:
+                return hit
+
+        if hedge and config.LLM_HEDGE_DELAY > 0 and len(providers) > 1:
+            try:
+                provider, text = await self._hedged(providers, prompt, model_name, temperature)
+            except ProviderError as e:
+                return _error_response(e)
+        else:
+            provider, text, last_error = None, None, None
+            for candidate in providers:
+                try:
+                    text = await self._attempt(candidate, prompt, model_name, temperature)
+                    provider = candidate
+                    break
+                except ProviderError as e:
+                    print(e)
+                    last_error = e
+            if provider is None:
+                return _error_response(last_error)
+
+        if keys:
+            self.cache.put(keys[provider.name], text)
+        return text
+
+    async def stream(self, prompt: Prompt, model_name: str = "gemini-2.0-flash", temperature: float = 0.7) -> AsyncIterator[str]:
+        """Streaming variant of complete(): yields text chunks as the provider produces them.
+
+        Falls back to the next provider only if nothing has been streamed yet.
+        """
+        providers = self._ordered_providers()
+        if not providers:
+            yield self._unavailable()
+            return
+
+        keys = self._cache_keys(providers, prompt, model_name, temperature)
+        if keys:
+            hit = self._cached(keys)
+            if hit is not None:
+                yield hit
+                return
+
+        last_error: Optional[ProviderError] = None
+        for provider in providers:
+            chunks = []
+            started = time.monotonic()
+            try:
+                async for chunk in provider.stream(prompt, model_name, temperature):
+                    if not chunks:
+                        # Route on time-to-first-token for streams
+                        self.router.record_success(provider.name, time.monotonic() - started)
+                    chunks.append(chunk)
+                    yield chunk
+            except ProviderError as e:
+                print(e)
+                if chunks:
+                    yield f"\n[Stream interrupted: {e}]"
+                    return
+                self.router.record_failure(provider.name)
+                last_error = e
+                continue
+            if keys:
+                self.cache.put(keys[provider.name], "".join(chunks))
+            return
+
+        yield _error_response(last_error)
+
+
+_llm_client = LLMClient()
+
+def get_llm_client():
+    return _llm_client
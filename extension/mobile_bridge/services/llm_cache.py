@@ -0,0 +1,144 @@
+"""
+Content-addressed cache for deterministic LLM responses.
+
+Entries are keyed on a hash of (provider, model, prompt, temperature) and
+evicted by LRU order, TTL and a total size cap. When a file path is given
+the cache is also persisted (by the PersistenceWriter thread) and reloaded
+on startup.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from .persistence import PersistenceWriter
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024, ttl: float = 3600,
+                 path: Optional[str] = None, writer: Optional[PersistenceWriter] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        # key -> (response, expires_at), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writer = writer
+        if path and writer:
+            self._load()
+            writer.register(self)
+
+    @staticmethod
+    def key(provider: str, model: str, prompt: str, temperature: float) -> str:
+        digest = hashlib.sha256()
+        for part in (provider, model, repr(float(temperature)), prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def _size(key: str, value: str) -> int:
+        return len(key) + len(value.encode("utf-8"))
+
+    def get(self, key: str, count: bool = True) -> Optional[str]:
+        """Cached value for `key`. With count=False the caller records the outcome via record()."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] <= time.time():
+                self._remove(key)
+                item = None
+            if item is not None:
+                self._entries.move_to_end(key)
+            if count:
+                self._record(item is not None)
+            return item[0] if item is not None else None
+
+    def record(self, hit: bool):
+        """Count one lookup made of several uncounted get() calls."""
+        with self._lock:
+            self._record(hit)
+
+    def _record(self, hit: bool):
+        """Caller holds the lock."""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def put(self, key: str, value: str, expires_at: Optional[float] = None):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at or time.time() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            self._dirty = True
+        if self._writer and self.path:
+            self._writer.mark_dirty()
+
+    def _remove(self, key: str):
+        """Caller holds the lock."""
+        value, _ = self._entries.pop(key)
+        self._bytes -= self._size(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._dirty = True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+    # ─── Persistence ─────────────────────────────────────────────────────────
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error loading LLM cache: {e}")
+            return
+        now = time.time()
+        for key, (value, expires_at) in data.items():
+            if expires_at > now:
+                self.put(key, value, expires_at)
+        with self._lock:
+            self._dirty = False
+
+    def flush(self):
+        """Write the cache to disk if it changed. Runs on the writer thread."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: [value, expires_at] for key, (value, expires_at) in self._entries.items()}
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
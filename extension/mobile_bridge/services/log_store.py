@@ -0,0 +1,346 @@
+"""
+Bounded per-agent log store.
+
+Only the newest entries of each agent are kept in memory, in a fixed-size
+ring. Every entry is also written through (by the PersistenceWriter thread)
+to append-only segment files on disk:
+
+    <root>/<agent id>/<first seq>.jsonl
+
+Each line is a compact [seq, timestamp, level, message] array, and a
+segment is rotated after a fixed number of entries, so memory stays flat
+however long the process runs while the full history remains on disk.
+"""
+import os
+import json
+import bisect
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Collection, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+from .persistence import PersistenceWriter
+
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class LogEntry:
+    __slots__ = ("seq", "timestamp", "level", "message")
+
+    def __init__(self, seq: int, timestamp: float, level: str, message: str):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.level = level
+        self.message = message
+
+    def to_dict(self) -> Dict:
+        return {
+            "seq": self.seq,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "level": self.level,
+            "message": self.message,
+        }
+
+    def to_record(self) -> list:
+        return [self.seq, self.timestamp, self.level, self.message]
+
+    @classmethod
+    def from_record(cls, record: list) -> "LogEntry":
+        return cls(*record)
+
+
+class _AgentLog:
+    """Ring buffer plus on-disk segment index for a single agent."""
+
+    def __init__(self, directory: str, ring_size: int):
+        self.directory = directory
+        self.ring: Deque[LogEntry] = deque(maxlen=ring_size)
+        # Entries appended but not yet written to disk
+        self.pending: List[LogEntry] = []
+        # Sorted first-seq of every segment file on disk
+        self.segments: List[int] = []
+        # Timestamp of the first entry of each segment, filled in lazily
+        self.segment_start_ts: Dict[int, float] = {}
+        self.active_count = 0
+        self.next_seq = 1
+
+    def segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{first_seq:012d}{SEGMENT_SUFFIX}")
+
+
+def _read_segment(path: str) -> List[LogEntry]:
+    entries = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(LogEntry.from_record(json.loads(line)))
+                except (ValueError, TypeError):
+                    # Torn write at the tail of a segment
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _parse_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return datetime.now().timestamp()
+
+
+class LogStore:
+    def __init__(self, root: str, writer: PersistenceWriter, ring_size: int = 200, segment_entries: int = 2000):
+        self.root = root
+        self.ring_size = ring_size
+        self.segment_entries = segment_entries
+        self._agents: Dict[str, _AgentLog] = {}
+        # Agents to drop from memory once their pending entries are on disk
+        self._evicting: Set[str] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._writer = writer
+        writer.register(self)
+
+    def _dir_for(self, agent_id: str) -> str:
+        name = quote(agent_id, safe="")
+        if name in (".", ".."):
+            name = name.replace(".", "%2E")
+        return os.path.join(self.root, name)
+
+    def _get(self, agent_id: str) -> _AgentLog:
+        """Return the agent's log, indexing its segments on first access. Caller holds the lock."""
+        log = self._agents.get(agent_id)
+        if log is not None:
+            return log
+
+        log = _AgentLog(self._dir_for(agent_id), self.ring_size)
+        if os.path.isdir(log.directory):
+            log.segments = sorted(
+                int(name[:-len(SEGMENT_SUFFIX)])
+                for name in os.listdir(log.directory)
+                if name.endswith(SEGMENT_SUFFIX)
+            )
+            # Warm the ring from the newest segments
+            tail: List[LogEntry] = []
+            for first_seq in reversed(log.segments):
+                entries = _read_segment(log.segment_path(first_seq))
+                if first_seq == log.segments[-1]:
+                    log.active_count = len(entries)
+                    if entries:
+                        log.next_seq = entries[-1].seq + 1
+                tail = entries + tail
+                if len(tail) >= self.ring_size:
+                    break
+            log.ring.extend(tail[-self.ring_size:])
+        self._agents[agent_id] = log
+        return log
+
+    # ─── Writes ──────────────────────────────────────────────────────────────
+
+    def append(self, agent_id: str, level: str, message: str, timestamp: Optional[float] = None) -> LogEntry:
+        with self._lock:
+            log = self._get(agent_id)
+            entry = LogEntry(log.next_seq, timestamp or datetime.now().timestamp(), level, message)
+            log.next_seq += 1
+            log.ring.append(entry)
+            log.pending.append(entry)
+        self._writer.mark_dirty()
+        return entry
+
+    def import_entries(self, agent_id: str, entries: Iterable[Dict]):
+        """Append legacy dict-shaped entries ({timestamp, level, message})."""
+        for entry in entries:
+            self.append(
+                agent_id,
+                entry.get("level", "info"),
+                entry.get("message", ""),
+                timestamp=_parse_timestamp(entry.get("timestamp")),
+            )
+
+    def flush(self):
+        """Write pending entries to their segment files. Runs on the writer thread.
+
+        Entries stay in `pending` until they are on disk so readers never
+        see a gap between memory and the segment files.
+        """
+        # One flush at a time: overlapping ones would write the same pending entries twice
+        with self._flush_lock:
+            with self._lock:
+                batches = [(log, list(log.pending)) for log in self._agents.values() if log.pending]
+
+            for log, entries in batches:
+                written = len(entries)
+                os.makedirs(log.directory, exist_ok=True)
+                while entries:
+                    with self._lock:
+                        if not log.segments or log.active_count >= self.segment_entries:
+                            log.segments.append(entries[0].seq)
+                            log.active_count = 0
+                        room = self.segment_entries - log.active_count
+                        first_seq = log.segments[-1]
+                    chunk, entries = entries[:room], entries[room:]
+                    with open(log.segment_path(first_seq), "a") as f:
+                        f.write("".join(json.dumps(e.to_record(), separators=(",", ":")) + "\n" for e in chunk))
+                    with self._lock:
+                        log.active_count += len(chunk)
+                with self._lock:
+                    del log.pending[:written]
+
+            with self._lock:
+                for agent_id in list(self._evicting):
+                    log = self._agents.get(agent_id)
+                    if log is None or not log.pending:
+                        self._agents.pop(agent_id, None)
+                        self._evicting.discard(agent_id)
+
+    def evict(self, agent_id: str):
+        """Drop an agent's log from memory; its segments stay on disk and are reindexed on next access."""
+        with self._lock:
+            log = self._agents.get(agent_id)
+            if log is None:
+                return
+            if not log.pending:
+                del self._agents[agent_id]
+                return
+            self._evicting.add(agent_id)
+        self._writer.mark_dirty()
+
+    # ─── Reads ───────────────────────────────────────────────────────────────
+
+    def recent(self, agent_id: str, limit: Optional[int] = None) -> List[LogEntry]:
+        """Newest entries held in memory, oldest first."""
+        with self._lock:
+            entries = list(self._get(agent_id).ring)
+        return entries[-limit:] if limit else entries
+
+    def query(
+        self,
+        agent_id: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 100,
+        levels: Optional[Collection[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[List[LogEntry], bool]:
+        """Page through an agent's history by sequence id.
+
+        With `after`, returns the oldest matching entries following that
+        cursor; otherwise returns the newest matching entries preceding
+        `before` (or the end of the log). Entries are always oldest first.
+        Only the segments the page touches are read from disk. Returns
+        (entries, has_more).
+        """
+        def matches(entry: LogEntry) -> bool:
+            if levels and entry.level not in levels:
+                return False
+            if since is not None and entry.timestamp < since:
+                return False
+            if until is not None and entry.timestamp > until:
+                return False
+            return True
+
+        with self._lock:
+            log = self._get(agent_id)
+            memory = self._memory_view(log)
+            segments = list(log.segments)
+        disk_end = memory[0].seq if memory else log.next_seq
+
+        page: List[LogEntry] = []
+        if after is not None:
+            start = after + 1
+            if since is not None:
+                start = max(start, self._first_seq_since(log, segments, since))
+            for entry in self._iter_forward(log, segments, memory, disk_end, start):
+                if before is not None and entry.seq >= before:
+                    break
+                if until is not None and entry.timestamp > until:
+                    break
+                if matches(entry):
+                    page.append(entry)
+                    if len(page) > limit:
+                        break
+            has_more = len(page) > limit
+            return page[:limit], has_more
+
+        end = before - 1 if before is not None else log.next_seq - 1
+        for entry in self._iter_backward(log, segments, memory, disk_end, end):
+            if since is not None and entry.timestamp < since:
+                break
+            if matches(entry):
+                page.append(entry)
+                if len(page) > limit:
+                    break
+        has_more = len(page) > limit
+        page = page[:limit]
+        page.reverse()
+        return page, has_more
+
+    def _memory_view(self, log: _AgentLog) -> List[LogEntry]:
+        """Contiguous run of the newest entries available without disk I/O. Caller holds the lock."""
+        ring = list(log.ring)
+        if log.pending and (not ring or log.pending[0].seq < ring[0].seq):
+            head = [e for e in log.pending if not ring or e.seq < ring[0].seq]
+            return head + ring
+        return ring
+
+    def _iter_forward(self, log, segments, memory, disk_end, start) -> Iterator[LogEntry]:
+        if start < disk_end and segments:
+            idx = max(bisect.bisect_right(segments, start) - 1, 0)
+            for first_seq in segments[idx:]:
+                if first_seq >= disk_end:
+                    break
+                for entry in _read_segment(log.segment_path(first_seq)):
+                    if start <= entry.seq < disk_end:
+                        yield entry
+        for entry in memory:
+            if entry.seq >= start:
+                yield entry
+
+    def _iter_backward(self, log, segments, memory, disk_end, end) -> Iterator[LogEntry]:
+        for entry in reversed(memory):
+            if entry.seq <= end:
+                yield entry
+        end = min(end, disk_end - 1)
+        if not segments or end < 1:
+            return
+        idx = bisect.bisect_right(segments, end) - 1
+        for first_seq in reversed(segments[:idx + 1]):
+            for entry in reversed(_read_segment(log.segment_path(first_seq))):
+                if entry.seq <= end:
+                    yield entry
+
+    def _first_seq_since(self, log: _AgentLog, segments: List[int], since: float) -> int:
+        """Lowest seq that can be at or after `since`, using the per-segment start times."""
+        lo, hi = 0, len(segments)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._segment_start(log, segments[mid]) <= since:
+                lo = mid + 1
+            else:
+                hi = mid
+        # The segment before `lo` starts at or before `since` and may still contain matches
+        return segments[lo - 1] if lo > 0 else 1
+
+    def _segment_start(self, log: _AgentLog, first_seq: int) -> float:
+        ts = log.segment_start_ts.get(first_seq)
+        if ts is None:
+            ts = float("-inf")
+            try:
+                with open(log.segment_path(first_seq), "r") as f:
+                    ts = LogEntry.from_record(json.loads(f.readline())).timestamp
+            except (OSError, ValueError, TypeError):
+                pass
+            log.segment_start_ts[first_seq] = ts
+        return ts
+
+    def agent_ids(self) -> List[str]:
+        with self._lock:
+            known = set(self._agents)
+        if os.path.isdir(self.root):
+            known.update(unquote(name) for name in os.listdir(self.root))
+        return sorted(known)
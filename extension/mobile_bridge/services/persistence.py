@@ -0,0 +1,254 @@
+"""
+Snapshot + append-only journal persistence for agents.
+
+Every mutation is appended to the journal as a single JSON line, so the
+cost of a write no longer depends on how much history has been recorded.
+Once the journal grows past a threshold it is folded into a fresh
+snapshot and truncated.
+
+Mutations are only buffered in memory on the calling thread; a background PersistenceWriter
+thread drains the buffers at most once per interval, so request handlers
+never touch the disk.
+"""
+import os
+import json
+import atexit
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Journal record types
+REC_GENERATION = "gen"
+REC_AGENT = "agent"
+REC_AGENT_REMOVED = "del"
+REC_LOG = "log"
+
+SnapshotProvider = Callable[[], Dict[str, Any]]
+
+
+def _journal_path_for(snapshot_path: str) -> str:
+    root, _ = os.path.splitext(snapshot_path)
+    return root + ".journal"
+
+
+class PersistenceWriter:
+    """Background thread that flushes dirty stores, coalescing bursts of writes."""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._targets: List[Any] = []
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._atexit_registered = False
+
+    def register(self, target: Any):
+        """Register an object exposing flush() to be drained by this writer."""
+        self._targets.append(target)
+
+    def mark_dirty(self):
+        self._dirty.set()
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None or self._stopping.is_set():
+                return
+            self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._dirty.wait()
+            # Let the burst accumulate; stop() cuts the window short
+            self._stopping.wait(self.interval)
+            self._dirty.clear()
+            self.flush()
+
+    def flush(self):
+        for target in self._targets:
+            try:
+                target.flush()
+            except Exception as e:
+                print(f"Error flushing {type(target).__name__}: {e}")
+
+    def stop(self):
+        """Stop the thread and flush anything still pending. Safe to call repeatedly.
+
+        The writer starts again on the next mark_dirty(), e.g. after the
+        extension is reloaded or a new app lifespan begins.
+        """
+        self._stopping.set()
+        self._dirty.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._dirty.clear()
+        self.flush()
+        with self._start_lock:
+            self._thread = None
+            self._stopping.clear()
+        # Writes that arrived during the final flush still need a thread
+        if self._dirty.is_set():
+            self._start()
+
+
+class AgentStore:
+    def __init__(self, snapshot_path: str, writer: PersistenceWriter, compact_every: int = 500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = _journal_path_for(snapshot_path)
+        self.compact_every = compact_every
+        self.generation = 0
+        self._journal_records = 0
+        self._journal = None
+        self._snapshot_provider: Optional[SnapshotProvider] = None
+        self._lock = threading.Lock()
+        # Pending mutations; agent records are coalesced by id so a burst of
+        # updates to the same agent costs a single journal line
+        self._pending_agents: Dict[str, Dict] = {}
+        self._writer = writer
+        writer.register(self)
+
+    def set_snapshot_provider(self, provider: SnapshotProvider):
+        """Register the callable that returns the full state used for compaction."""
+        self._snapshot_provider = provider
+
+    # ─── Loading ─────────────────────────────────────────────────────────────
+
+    def load(self) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+        """Replay snapshot plus journal. Returns (agents, logs).
+
+        Logs now live in the LogStore; any returned here come from files
+        written before it existed and should be imported once.
+        """
+        agents: Dict[str, Dict] = {}
+        logs: Dict[str, List[Dict]] = {}
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                data = json.load(f)
+            for agent_data in data.get("agents", []):
+                agents[agent_data["id"]] = agent_data
+            logs = data.get("logs", {})
+            self.generation = data.get("generation", 0)
+
+        if os.path.exists(self.journal_path) and not self._replay_journal(agents, logs):
+            # Records appended after the stale header would be skipped by
+            # every later load, so start a journal for the current generation
+            self._start_journal()
+
+        return list(agents.values()), logs
+
+    def _replay_journal(self, agents: Dict[str, Dict], logs: Dict[str, List[Dict]]) -> bool:
+        """Apply journal records on top of the snapshot. False if the journal is stale."""
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write at the tail of the journal; everything before it is intact
+                    print(f"Ignoring corrupt journal record in {self.journal_path}")
+                    continue
+
+                kind = record.get("t")
+                if kind == REC_GENERATION:
+                    if record.get("g", 0) < self.generation:
+                        # Journal predates the snapshot (crash during compaction)
+                        return False
+                elif kind == REC_AGENT:
+                    agents[record["d"]["id"]] = record["d"]
+                elif kind == REC_AGENT_REMOVED:
+                    agents.pop(record["id"], None)
+                elif kind == REC_LOG:  # legacy
+                    logs.setdefault(record["id"], []).append(record["d"])
+                self._journal_records += 1
+        return True
+
+    # ─── Mutations ───────────────────────────────────────────────────────────
+
+    def record_agent(self, agent_data: Dict):
+        with self._lock:
+            self._pending_agents[agent_data["id"]] = {"t": REC_AGENT, "d": agent_data}
+        self._writer.mark_dirty()
+
+    def record_agent_removed(self, agent_id: str):
+        with self._lock:
+            self._pending_agents[agent_id] = {"t": REC_AGENT_REMOVED, "id": agent_id}
+        self._writer.mark_dirty()
+
+    def flush(self):
+        """Append pending mutations to the journal in one write. Runs on the writer thread."""
+        with self._lock:
+            records = list(self._pending_agents.values())
+            self._pending_agents = {}
+        if not records:
+            return
+
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a")
+            if self._journal.tell() == 0:
+                self._write_generation_header()
+        self._journal.write("".join(json.dumps(r, default=str, separators=(",", ":")) + "\n" for r in records))
+        self._journal.flush()
+        self._journal_records += len(records)
+
+        if self._journal_records >= self.compact_every:
+            self.compact()
+
+    def _write_generation_header(self):
+        self._journal.write(json.dumps({"t": REC_GENERATION, "g": self.generation}) + "\n")
+
+    # ─── Compaction ──────────────────────────────────────────────────────────
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal. Runs on the writer thread."""
+        if self._snapshot_provider is None:
+            return
+        with self._lock:
+            # The snapshot already reflects anything still pending
+            data = dict(self._snapshot_provider())
+            self._pending_agents = {}
+        data["generation"] = self.generation + 1
+
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, default=str, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.generation += 1
+
+        self._start_journal()
+
+    def _start_journal(self):
+        """Truncate the journal and write the current generation header."""
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "w")
+        self._write_generation_header()
+        self._journal.flush()
+        self._journal_records = 0
+
+    def close(self):
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+_writer: Optional[PersistenceWriter] = None
+
+
+def get_persistence_writer() -> PersistenceWriter:
+    global _writer
+    if _writer is None:
+        from ..config import config
+        _writer = PersistenceWriter(interval=config.PERSIST_INTERVAL)
+    return _writer
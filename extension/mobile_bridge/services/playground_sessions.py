@@ -0,0 +1,135 @@
+"""
+Independent playground conversations.
+
+Each session owns its conversation context and an asyncio lock, so turns
+within one session run one at a time while different sessions (e.g. two
+paired devices) run in parallel. Sessions idle for longer than a TTL, and
+the least recently used ones beyond a cap, are evicted to bound memory,
+and the eviction callback lets the owner drop whatever else it keeps per
+session. Requests that name no session share DEFAULT_SESSION_ID.
+
+With a shared state backend the conversation is also saved there after
+each run, so a session continues on whichever worker serves its next
+request.
+"""
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from .conversation import Conversation
+from .state_backend import get_state_backend
+
+SESSION_PREFIX = "playground-"
+# Used by clients that do not send a session_id
+DEFAULT_SESSION_ID = f"{SESSION_PREFIX}main"
+
+
+def resolve_session_id(session_id: Optional[str]) -> str:
+    """Map a client-supplied session id into the playground namespace."""
+    if not session_id:
+        return DEFAULT_SESSION_ID
+    return session_id if session_id.startswith(SESSION_PREFIX) else f"{SESSION_PREFIX}{session_id}"
+
+
+class PlaygroundSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.lock = asyncio.Lock()
+        self.conversation: Optional[Conversation] = None
+        self.created_at = datetime.now()
+        self.last_used = time.monotonic()
+        self.runs = 0
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "created_at": self.created_at.isoformat(),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "runs": self.runs,
+            "busy": self.lock.locked(),
+            "context_tokens": self.conversation.tokens if self.conversation else 0,
+        }
+
+
+class SessionManager:
+    def __init__(self, idle_ttl: float = 1800, max_sessions: int = 100):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._state = get_state_backend()
+        # Least recently used first
+        self._sessions: "OrderedDict[str, PlaygroundSession]" = OrderedDict()
+        self._evict_callback: Optional[Callable[[str], None]] = None
+
+    def set_evict_callback(self, callback: Callable[[str], None]):
+        """Register a callback invoked with the id of every evicted session."""
+        self._evict_callback = callback
+
+    def get(self, session_id: str) -> PlaygroundSession:
+        """Return the session, creating it if needed, and mark it as used."""
+        self.evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = PlaygroundSession(session_id)
+            if self._state.shared:
+                saved = self._state.get(f"session:{session_id}")
+                if saved:
+                    session.conversation = Conversation.from_dict(json.loads(saved))
+        self._sessions.move_to_end(session_id)
+        session.touch()
+        self._evict_over_cap()
+        return session
+
+    def save(self, session: PlaygroundSession):
+        """Share the session's conversation with other workers."""
+        if self._state.shared and session.conversation is not None:
+            self._state.set(f"session:{session.id}", json.dumps(session.conversation.to_dict()), ttl=self.idle_ttl)
+
+    def remove(self, session_id: str) -> bool:
+        shared = self._state.shared and self._state.get(f"session:{session_id}") is not None
+        if shared:
+            self._state.delete(f"session:{session_id}")
+        return self._sessions.pop(session_id, None) is not None or shared
+
+    def list(self) -> List[PlaygroundSession]:
+        self.evict_idle()
+        return list(reversed(self._sessions.values()))
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for session_id in [s.id for s in self._sessions.values() if s.last_used < cutoff and not s.lock.locked()]:
+            self._evict(session_id)
+
+    def _evict_over_cap(self):
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        # Never drop a session that is mid-run
+        for session_id in [s.id for s in self._sessions.values() if not s.lock.locked()][:excess]:
+            self._evict(session_id)
+
+    def _evict(self, session_id: str):
+        del self._sessions[session_id]
+        if self._evict_callback:
+            try:
+                self._evict_callback(session_id)
+            except Exception as e:
+                print(f"Error evicting session {session_id}: {e}")
+
+
+_session_manager: Optional[SessionManager] = None
+
+
+def get_session_manager() -> SessionManager:
+    global _session_manager
+    if _session_manager is None:
+        from ..config import config
+        _session_manager = SessionManager(
+            idle_ttl=config.PLAYGROUND_SESSION_IDLE_TTL,
+            max_sessions=config.PLAYGROUND_MAX_SESSIONS,
+        )
+    return _session_manager
@@ -0,0 +1,123 @@
+"""
+Health tracking and routing for LLM providers.
+
+Each provider keeps a rolling window of call outcomes and an EWMA of its
+latency. When the error rate over the window crosses a threshold the
+provider's circuit opens and it is skipped until a cooldown elapses; after
+that a single trial call decides whether it closes again. Healthy providers
+are tried fastest first.
+"""
+import time
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderHealth:
+    def __init__(self, name: str, window: int = 10, error_rate: float = 0.5, min_calls: int = 3,
+                 cooldown: float = 30.0, ewma_alpha: float = 0.3):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.ewma_alpha = ewma_alpha
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.latency: Optional[float] = None
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._trial_started: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Whether a call may be sent now. Moves an expired open circuit to half-open."""
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._trial_started = None
+        # One trial at a time; hand out another if the last one never reported back
+        if self.state == HALF_OPEN and (self._trial_started is None or now - self._trial_started >= self.cooldown):
+            self._trial_started = now
+            return True
+        return False
+
+    def record_success(self, latency: float):
+        self.latency = latency if self.latency is None else (
+            self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.latency)
+        if self.state != CLOSED:
+            # Trial call succeeded; forget the failures that opened the circuit
+            self.outcomes.clear()
+            self.state = CLOSED
+        self.outcomes.append(True)
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        print(f"[MobileBridge] Circuit opened for LLM provider '{self.name}'")
+
+    def snapshot(self) -> Dict:
+        calls = len(self.outcomes)
+        return {
+            "state": self.state,
+            "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+            "error_rate": round(self.outcomes.count(False) / calls, 3) if calls else None,
+            "calls": calls,
+        }
+
+
+class ProviderRouter:
+    def __init__(self, **health_options):
+        self._health_options = health_options
+        self._health: Dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    def order(self, names: List[str]) -> List[str]:
+        """Providers to try, fastest healthy first.
+
+        `names` is in configured priority order, which breaks ties. Providers
+        with no latency samples yet are tried ahead of measured ones so each
+        gets measured at least once.
+        If every circuit is open, the original order is returned so a call
+        is still attempted.
+        """
+        with self._lock:
+            allowed = [n for n in names if self._health_for(n).allow()]
+            if not allowed:
+                return list(names)
+            return sorted(allowed, key=lambda n: (
+                self._health[n].latency is not None,
+                self._health[n].latency or 0.0,
+                names.index(n),
+            ))
+
+    def _health_for(self, name: str) -> ProviderHealth:
+        """Caller holds the lock."""
+        health = self._health.get(name)
+        if health is None:
+            health = self._health[name] = ProviderHealth(name, **self._health_options)
+        return health
+
+    def record_success(self, name: str, latency: float):
+        with self._lock:
+            self._health_for(name).record_success(latency)
+
+    def record_failure(self, name: str):
+        with self._lock:
+            self._health_for(name).record_failure()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: health.snapshot() for name, health in self._health.items()}
@@ -0,0 +1,282 @@
+"""
+SQLite storage backend for agents and logs.
+
+An alternative to the JSON snapshot/journal and on-disk log segments,
+selected with STORAGE_BACKEND=sqlite. The database runs in WAL mode so
+readers never block the writer. Logs are indexed by agent and sequence
+and by agent and timestamp. Agents are only ever loaded whole into the
+registry, which keeps its own indexes, so their table has just the primary
+key. Nothing else is loaded into memory up front: log pages are indexed
+range queries.
+
+Writes are buffered like the file stores and committed by the
+PersistenceWriter thread, one transaction per flush. Statements are fixed
+parameterized strings, so sqlite3 keeps them compiled in its per-connection
+statement cache.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+from .log_store import LogEntry, _parse_timestamp
+from .persistence import PersistenceWriter
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agents (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    status TEXT,
+    workspace TEXT,
+    last_active TEXT,
+    data TEXT NOT NULL
+);
+DROP INDEX IF EXISTS agents_status;
+DROP INDEX IF EXISTS agents_workspace;
+DROP INDEX IF EXISTS agents_last_active;
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    level TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs_agent_seq ON logs (agent_id, seq);
+CREATE INDEX IF NOT EXISTS logs_agent_timestamp ON logs (agent_id, timestamp);
+"""
+
+_UPSERT_AGENT = (
+    "INSERT INTO agents (id, name, status, workspace, last_active, data) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, status = excluded.status, "
+    "workspace = excluded.workspace, last_active = excluded.last_active, data = excluded.data"
+)
+_DELETE_AGENT = "DELETE FROM agents WHERE id = ?"
+_INSERT_LOG = "INSERT INTO logs (agent_id, timestamp, level, message) VALUES (?, ?, ?, ?)"
+
+
+class SQLiteDatabase:
+    """One write connection shared under a lock, plus a read connection per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                               timeout=5.0, cached_statements=128)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def write(self, fn):
+        """Run fn(connection) in a single transaction."""
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._writer)
+                self._writer.execute("COMMIT")
+                return result
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.reader().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self.write(lambda c: c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)))
+
+    def delete_meta(self, key: str):
+        self.write(lambda c: c.execute("DELETE FROM meta WHERE key = ?", (key,)))
+
+    def claim_meta(self, key: str, value: str) -> bool:
+        """Set key only if it is unset. True for the one caller, across processes, that set it."""
+        return self.write(
+            lambda c: c.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, value)).rowcount == 1
+        )
+
+
+class SQLiteAgentStore:
+    """Drop-in replacement for AgentStore backed by the agents table."""
+
+    def __init__(self, db: SQLiteDatabase, writer: PersistenceWriter):
+        self.db = db
+        self.snapshot_path = db.path
+        self._lock = threading.Lock()
+        # agent id -> row data, or None for a removal; coalesced like the journal
+        self._pending: Dict[str, Optional[Dict]] = {}
+        self._writer = writer
+        writer.register(self)
+
+    def set_snapshot_provider(self, provider):
+        # Rows are updated in place; there is nothing to compact
+        pass
+
+    def load(self) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+        rows = self.db.reader().execute("SELECT data FROM agents").fetchall()
+        return [json.loads(data) for (data,) in rows], {}
+
+    def record_agent(self, agent_data: Dict):
+        with self._lock:
+            self._pending[agent_data["id"]] = agent_data
+        self._writer.mark_dirty()
+
+    def record_agent_removed(self, agent_id: str):
+        with self._lock:
+            self._pending[agent_id] = None
+        self._writer.mark_dirty()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            self._write(pending)
+        except Exception:
+            # Keep the rows for the next flush; newer changes to the same agent win
+            with self._lock:
+                for agent_id, data in pending.items():
+                    self._pending.setdefault(agent_id, data)
+            raise
+
+    def _write(self, pending: Dict[str, Optional[Dict]]):
+        upserts = [
+            (d["id"], d.get("name"), d.get("status"), d.get("workspace"), d.get("last_active"),
+             json.dumps(d, default=str, separators=(",", ":")))
+            for d in pending.values() if d is not None
+        ]
+        deletes = [(agent_id,) for agent_id, d in pending.items() if d is None]
+
+        def write(conn):
+            if upserts:
+                conn.executemany(_UPSERT_AGENT, upserts)
+            if deletes:
+                conn.executemany(_DELETE_AGENT, deletes)
+        self.db.write(write)
+
+    def compact(self):
+        self.flush()
+
+    def close(self):
+        self.flush()
+
+
+class SQLiteLogStore:
+    """Drop-in replacement for LogStore backed by the logs table.
+
+    Sequence ids come from the table's rowid, so they are unique even with
+    several worker processes writing to the same database.
+    """
+
+    def __init__(self, db: SQLiteDatabase, writer: PersistenceWriter):
+        self.db = db
+        self.root = db.path
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: List[Tuple[str, LogEntry]] = []
+        self._writer = writer
+        writer.register(self)
+
+    def append(self, agent_id: str, level: str, message: str, timestamp: Optional[float] = None) -> LogEntry:
+        # seq is assigned when the entry is written
+        entry = LogEntry(None, timestamp or datetime.now().timestamp(), level, message)
+        with self._lock:
+            self._pending.append((agent_id, entry))
+        self._writer.mark_dirty()
+        return entry
+
+    def import_entries(self, agent_id: str, entries: Iterable[Dict]):
+        for entry in entries:
+            self.append(
+                agent_id,
+                entry.get("level", "info"),
+                entry.get("message", ""),
+                timestamp=_parse_timestamp(entry.get("timestamp")),
+            )
+
+    def flush(self):
+        """Insert pending entries in one transaction. Also called before reads."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            def write(conn):
+                for agent_id, entry in pending:
+                    cursor = conn.execute(_INSERT_LOG, (agent_id, entry.timestamp, entry.level, entry.message))
+                    entry.seq = cursor.lastrowid
+            try:
+                self.db.write(write)
+            except Exception:
+                # Put the entries back ahead of any appended meanwhile
+                with self._lock:
+                    self._pending[:0] = pending
+                raise
+
+    def evict(self, agent_id: str):
+        # Nothing is held in memory per agent
+        pass
+
+    def recent(self, agent_id: str, limit: Optional[int] = None) -> List[LogEntry]:
+        entries, _ = self.query(agent_id, limit=limit or 200)
+        return entries
+
+    def query(
+        self,
+        agent_id: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 100,
+        levels: Optional[Collection[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[List[LogEntry], bool]:
+        """Same contract as LogStore.query, answered by an indexed range scan."""
+        # Entries appended by this process must be visible to its own reads
+        self.flush()
+        sql, params = "SELECT seq, timestamp, level, message FROM logs WHERE agent_id = ?", [agent_id]
+        if after is not None:
+            sql += " AND seq > ?"
+            params.append(after)
+        if before is not None:
+            sql += " AND seq < ?"
+            params.append(before)
+        if since is not None:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND timestamp <= ?"
+            params.append(until)
+        if levels:
+            levels = sorted(levels)
+            sql += f" AND level IN ({','.join('?' * len(levels))})"
+            params.extend(levels)
+        sql += f" ORDER BY seq {'ASC' if after is not None else 'DESC'} LIMIT ?"
+        params.append(limit + 1)
+
+        page = [LogEntry(*row) for row in self.db.reader().execute(sql, params)]
+        has_more = len(page) > limit
+        page = page[:limit]
+        if after is None:
+            page.reverse()
+        return page, has_more
+
+    def agent_ids(self) -> List[str]:
+        self.flush()
+        return [row[0] for row in self.db.reader().execute("SELECT DISTINCT agent_id FROM logs ORDER BY agent_id")]
@@ -0,0 +1,243 @@
+"""
+Shared state for running several server workers.
+
+State that must agree across workers (JWT secret, pairing key, current
+workspace, agent changes, realtime events, job status and cancellation)
+goes through a StateBackend:
+
+- InProcessBackend: plain dict, nothing is shared. The default and the
+  only option for a single worker.
+- SQLiteBackend: a WAL-mode database file shared by every worker on the
+  host. Values live in a key/value table. Changes are appended to an
+  event table that each worker polls on a background thread and applies
+  locally, which gives cross-worker fan-out without another service.
+
+Events a worker publishes are never delivered back to itself.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+# Event kinds
+KIND_AGENT = "agent"
+KIND_EVENT = "event"
+KIND_WORKSPACE = "workspace"
+KIND_JOB = "job"
+
+Handler = Callable[[str, Dict[str, Any]], None]
+
+_remote = threading.local()
+
+
+def applying_remote() -> bool:
+    """True while the current thread applies a change published by another worker.
+
+    Listeners use this to avoid publishing (or persisting) the change again.
+    """
+    return getattr(_remote, "active", False)
+
+
+class InProcessBackend:
+    shared = False
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._values.get(key)
+        if item is None or (item[1] is not None and item[1] <= time.time()):
+            return None
+        return item[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def setdefault(self, key: str, value: str) -> str:
+        """Store `value` unless the key is already set; returns the stored value."""
+        with self._lock:
+            return self._values.setdefault(key, (value, None))[0]
+
+    def publish(self, kind: str, payload: Dict[str, Any]):
+        pass
+
+    def start(self, handler: Handler):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory"}
+
+
+class SQLiteBackend:
+    shared = True
+
+    def __init__(self, path: str, poll_interval: float = 0.1, retention: float = 300):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._outbox: Deque[Tuple[str, str, float]] = deque()
+        self._handler: Optional[Handler] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_seq = 0
+        self.published = 0
+        self.received = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires REAL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_created ON events (created);
+        """)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl if ttl else None),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def setdefault(self, key: str, value: str) -> str:
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO kv (key, value) VALUES (?, ?)", (key, value))
+            return self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0]
+
+    def publish(self, kind: str, payload: Dict[str, Any]):
+        """Queue an event for the other workers; written in batches by the poll thread."""
+        self._outbox.append((kind, json.dumps(payload, default=str), time.time()))
+
+    def start(self, handler: Handler):
+        if self._thread:
+            return
+        self._handler = handler
+        with self._lock:
+            self._last_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mobile-bridge-state", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self._flush_outbox()
+
+    def _run(self):
+        last_prune = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._flush_outbox()
+                self._poll()
+                if time.monotonic() - last_prune > 60:
+                    self._prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print(f"[MobileBridge] State backend error: {e}")
+
+    def _flush_outbox(self):
+        batch = []
+        while self._outbox:
+            batch.append(self._outbox.popleft())
+        if not batch:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO events (origin, kind, payload, created) VALUES (?, ?, ?, ?)",
+                    [(self.origin, kind, payload, created) for kind, payload, created in batch],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.published += len(batch)
+
+    def _poll(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, origin, kind, payload FROM events WHERE seq > ? ORDER BY seq", (self._last_seq,)
+            ).fetchall()
+        for seq, origin, kind, payload in rows:
+            self._last_seq = seq
+            if origin == self.origin or self._handler is None:
+                continue
+            self.received += 1
+            _remote.active = True
+            try:
+                self._handler(kind, json.loads(payload))
+            except Exception as e:
+                print(f"[MobileBridge] Error applying {kind} event from worker {origin}: {e}")
+            finally:
+                _remote.active = False
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+            self._conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "origin": self.origin,
+            "published": self.published,
+            "received": self.received,
+            "outbox": len(self._outbox),
+        }
+
+
+_backend = None
+
+
+def get_state_backend():
+    global _backend
+    if _backend is None:
+        from ..config import config
+        if config.STATE_BACKEND == "sqlite":
+            _backend = SQLiteBackend(config.STATE_DB, poll_interval=config.STATE_POLL_INTERVAL)
+        else:
+            _backend = InProcessBackend()
+    return _backend
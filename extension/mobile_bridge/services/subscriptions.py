@@ -0,0 +1,104 @@
+"""
+Topic subscriptions for realtime clients.
+
+Topics are plain strings: "agent:<id>", "workspace:<path>" and
+"event:<type>". A client receives an event if it is subscribed to any of
+the event's topics; clients that have not subscribed to anything receive
+every event. Topics map to their subscribers, so finding the recipients
+of an event costs a few set lookups however many clients are connected.
+"""
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+
+AGENT = "agent"
+WORKSPACE = "workspace"
+EVENT = "event"
+
+# Subscribe-message fields and the topic kind each one holds
+TOPIC_FIELDS = {"agents": AGENT, "workspaces": WORKSPACE, "events": EVENT}
+
+
+def topic(kind: str, value: str) -> str:
+    return f"{kind}:{value}"
+
+
+def event_topics(agent_id: str, event_type: str, workspace: Optional[str] = None) -> List[str]:
+    topics = [topic(AGENT, agent_id), topic(EVENT, event_type)]
+    if workspace:
+        topics.append(topic(WORKSPACE, workspace))
+    return topics
+
+
+def topics_from_request(request: Dict) -> List[str]:
+    """Topics named in a subscribe/unsubscribe message, e.g. {"agents": ["a1"], "events": ["agent_error"]}."""
+    topics = []
+    for field, kind in TOPIC_FIELDS.items():
+        values = request.get(field) or []
+        if isinstance(values, str):
+            values = [values]
+        topics.extend(topic(kind, str(v)) for v in values)
+    return topics
+
+
+class SubscriptionIndex:
+    def __init__(self, max_topics: int = 256):
+        self.max_topics = max_topics
+        self._subscribers: Dict[str, Set[Hashable]] = {}
+        self._topics: Dict[Hashable, Set[str]] = {}
+        # Clients with no subscriptions; they get everything
+        self._unfiltered: Set[Hashable] = set()
+
+    def add(self, client: Hashable):
+        self._unfiltered.add(client)
+
+    def remove(self, client: Hashable):
+        self._unfiltered.discard(client)
+        for t in self._topics.pop(client, ()):
+            self._discard(t, client)
+
+    def subscribe(self, client: Hashable, topics: Iterable[str]) -> Set[str]:
+        """Add topics for a client, up to max_topics in total. Returns its topics."""
+        current = self._topics.setdefault(client, set())
+        for t in topics:
+            if t in current:
+                continue
+            if len(current) >= self.max_topics:
+                break
+            current.add(t)
+            self._subscribers.setdefault(t, set()).add(client)
+        if current:
+            self._unfiltered.discard(client)
+        else:
+            del self._topics[client]
+        return set(current)
+
+    def unsubscribe(self, client: Hashable, topics: Iterable[str]) -> Set[str]:
+        """Drop topics for a client; one left with none receives everything again."""
+        current = self._topics.get(client)
+        if current is None:
+            return set()
+        for t in topics:
+            if t in current:
+                current.discard(t)
+                self._discard(t, client)
+        if not current:
+            del self._topics[client]
+            self._unfiltered.add(client)
+        return set(current)
+
+    def _discard(self, t: str, client: Hashable):
+        subscribers = self._subscribers.get(t)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self._subscribers[t]
+
+    def topics_for(self, client: Hashable) -> Set[str]:
+        return set(self._topics.get(client, ()))
+
+    def recipients(self, topics: Iterable[str]) -> Set[Hashable]:
+        result = set(self._unfiltered)
+        for t in topics:
+            subscribers = self._subscribers.get(t)
+            if subscribers:
+                result |= subscribers
+        return result
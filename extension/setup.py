@@ -12,6 +12,7 @@ setup(
         "pyjwt==2.8.0",
         "pydantic==2.6.0",
         "websockets==12.0",
+        "httpx",
         "google-generativeai"
     ],
     entry_points={
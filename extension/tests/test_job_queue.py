@@ -0,0 +1,36 @@
+import os
+import sys
+import asyncio
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mobile_bridge.services.job_queue import CANCELLED, SUCCEEDED, JobQueue
+
+
+async def _done(job):
+    yield {"type": "done"}
+
+
+def test_cancel_before_job_task_starts_keeps_worker():
+    async def scenario():
+        queue = JobQueue(workers=1)
+        job = await queue.submit("test", _done, "ws")
+        # Cancel as soon as the worker has created the job's task, before it runs
+        while job._task is None:
+            await asyncio.sleep(0)
+        assert job.started_at is None
+        await queue.cancel(job.id)
+
+        # The lone worker must survive and pick up the next job
+        follow_up = await queue.submit("test", _done, "ws")
+        for _ in range(100):
+            if follow_up.status == SUCCEEDED:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job, follow_up
+
+    job, follow_up = asyncio.run(scenario())
+    assert job.status == CANCELLED
+    assert follow_up.status == SUCCEEDED
@@ -0,0 +1,32 @@
+import os
+import sys
+import json
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mobile_bridge.services.persistence import AgentStore, PersistenceWriter
+
+
+def _store(path):
+    # A long interval keeps the background thread out of the way; the tests flush explicitly
+    return AgentStore(str(path), PersistenceWriter(interval=60))
+
+
+def test_stale_journal_is_reset_after_interrupted_compaction(tmp_path):
+    snapshot = tmp_path / "agents.json"
+    # Compaction wrote the generation 1 snapshot but died before truncating the journal
+    snapshot.write_text(json.dumps({"generation": 1, "agents": [{"id": "a", "v": 1}]}))
+    (tmp_path / "agents.journal").write_text(
+        json.dumps({"t": "gen", "g": 0}) + "\n" + json.dumps({"t": "agent", "d": {"id": "a", "v": 0}}) + "\n"
+    )
+
+    store = _store(snapshot)
+    agents, _ = store.load()
+    assert agents == [{"id": "a", "v": 1}]
+
+    store.record_agent({"id": "b", "v": 1})
+    store.close()
+
+    agents, _ = _store(snapshot).load()
+    assert sorted(a["id"] for a in agents) == ["a", "b"]
@@ -13,3 +13,34 @@ api.interceptors.request.use((config) => {
 });
 
 export default api;
+
+// POST to a Server-Sent Events endpoint and hand each decoded event to onEvent.
+export async function streamEvents(path: string, body: unknown, onEvent: (event: any) => void) {
+    const token = localStorage.getItem('antone_token');
+    const res = await fetch(`${api.defaults.baseURL}${path}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            ...(token ? { Authorization: `Bearer ${token}` } : {}),
+        },
+        body: JSON.stringify(body),
+    });
+    if (!res.ok || !res.body) throw new Error(`Request failed with status ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('data:')) onEvent(JSON.parse(line.slice(5)));
+            }
+        }
+    }
+}
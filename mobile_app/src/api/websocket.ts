@@ -1,37 +1,69 @@
 import { useEffect, useRef, useState } from 'react';
 import { useAuth } from '../context/AuthContext';
 
+const RECONNECT_DELAY_MS = 2000;
+
 export function useAgentSocket() {
     const { token } = useAuth();
     const socketRef = useRef<WebSocket | null>(null);
+    // Sequence number of the newest event seen, used to resume after a reconnect
+    const lastSeqRef = useRef<number | null>(null);
+    // Seqs restart with every server process; the epoch tells which run they belong to
+    const epochRef = useRef<string | null>(null);
     const [lastMessage, setLastMessage] = useState<any>(null);
     const [isConnected, setIsConnected] = useState(false);
 
     useEffect(() => {
         if (!token) return;
 
-        const wsUrl = `ws://127.0.0.1:8000/ws/realtime?token=${token}`;
-        const ws = new WebSocket(wsUrl);
-        socketRef.current = ws;
+        let closed = false;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
 
-        ws.onopen = () => {
-            console.log('WS Connected');
-            setIsConnected(true);
-        };
+        const connect = () => {
+            // batch: events arrive as one frame per 250ms window instead of one frame each
+            let wsUrl = `ws://127.0.0.1:8000/ws/realtime?token=${token}&batch=250`;
+            if (lastSeqRef.current !== null) wsUrl += `&since=${lastSeqRef.current}&epoch=${epochRef.current}`;
+            const ws = new WebSocket(wsUrl);
+            socketRef.current = ws;
+
+            ws.onopen = () => {
+                console.log('WS Connected');
+                setIsConnected(true);
+            };
+
+            ws.onmessage = (event) => {
+                try {
+                    const data = JSON.parse(event.data);
+                    const events: any[] = data.type === 'batch' ? data.events : [data];
+                    const resume = events.find((e) => typeof e.epoch === 'string');
+                    if (resume && resume.epoch !== epochRef.current) {
+                        // New server run: its seqs are not comparable with the old ones
+                        epochRef.current = resume.epoch;
+                        lastSeqRef.current = null;
+                    }
+                    const seqs = [data.seq, ...events.map((e) => e.seq)].filter((s) => typeof s === 'number');
+                    if (seqs.length) lastSeqRef.current = Math.max(lastSeqRef.current ?? 0, ...seqs);
+                    // Answer heartbeats so the server does not reap us as idle
+                    if (events.some((e) => e.type === 'ping')) ws.send(JSON.stringify({ type: 'pong' }));
+                    if (events.every((e) => e.type === 'ping')) return;
+                    setLastMessage(data);
+                } catch (e) {
+                    console.error('WS Parse Error', e);
+                }
+            };
 
-        ws.onmessage = (event) => {
-            try {
-                const data = JSON.parse(event.data);
-                setLastMessage(data);
-            } catch (e) {
-                console.error('WS Parse Error', e);
-            }
+            ws.onclose = () => {
+                setIsConnected(false);
+                if (!closed) retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+            };
         };
 
-        ws.onclose = () => setIsConnected(false);
+        connect();
 
         return () => {
-            ws.close();
+            closed = true;
+            clearTimeout(retryTimer);
+            socketRef.current?.close();
         };
     }, [token]);
 
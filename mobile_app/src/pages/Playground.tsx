@@ -1,6 +1,8 @@
 import { useState } from 'react';
 import { Send, Sparkles, Settings2, Trash2, RefreshCw } from 'lucide-react';
-import api from '../api/client';
+import { streamEvents } from '../api/client';
+
+const newSessionId = () => `playground-${Date.now().toString(36)}${Math.random().toString(36).slice(2, 8)}`;
 
 export default function Playground() {
     const [prompt, setPrompt] = useState('');
@@ -9,18 +11,26 @@ export default function Playground() {
     const [loading, setLoading] = useState(false);
     const [showSettings, setShowSettings] = useState(false);
     const [model, setModel] = useState('gemini-2.0-flash');
+    // Requests without a session share the server's default one, so each chat names its own
+    const [sessionId, setSessionId] = useState(newSessionId);
 
     const run = async () => {
         if (!prompt.trim()) return;
         setLoading(true);
         setResponse('');
         try {
-            const res = await api.post('/playground/run', {
+            await streamEvents('/playground/run/stream', {
                 user_prompt: prompt,
                 system_prompt: systemPrompt,
-                model
+                model,
+                session_id: sessionId
+            }, (event) => {
+                if (event.type === 'token') setResponse(prev => prev + event.text);
+                else if (event.type === 'tool') setResponse(prev => `${prev}\n[${event.name} ${event.arg}]\n`);
+                else if (event.type === 'done') {
+                    setResponse(event.response);
+                }
             });
-            setResponse(res.data.data.response);
         } catch (e) {
             setResponse('Error: ' + (e as any).message);
         } finally {
@@ -31,6 +41,7 @@ export default function Playground() {
     const clear = () => {
         setPrompt('');
         setResponse('');
+        setSessionId(newSessionId());
     };
 
     return (